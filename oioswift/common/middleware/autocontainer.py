@@ -13,7 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from oioswift.common.middleware.autocontainerbase import AutoContainerBase
+from oioswift.common.middleware.autocontainerbase import AutoContainerBase, \
+    DEFAULT_PATH_CACHE_SIZE
 from oio.common.autocontainer import AutocontainerBuilder
 
 
@@ -24,10 +25,12 @@ class AutoContainerMiddleware(AutoContainerBase):
     TRUE_VALUES = ["true", "yes", "1"]
 
     def __init__(self, app, default_account=None,
-                 strip_v1=False, account_first=False, **kwargs):
+                 strip_v1=False, account_first=False,
+                 path_cache_size=DEFAULT_PATH_CACHE_SIZE, **kwargs):
         super(AutoContainerMiddleware, self).__init__(
             app, acct=default_account,
-            strip_v1=strip_v1, account_first=account_first)
+            strip_v1=strip_v1, account_first=account_first,
+            path_cache_size=path_cache_size)
         self.con_builder = AutocontainerBuilder(**kwargs)
 
 
@@ -48,9 +51,12 @@ def filter_factory(global_config, **local_config):
     base = int(local_config.get('base', 16))
     mask = int(local_config.get('mask', 0xFFFFFFFFFF0000FF), 16)
     con_format = local_config.get('format', "%016X")
+    path_cache_size = int(local_config.get('path_cache_size',
+                                           DEFAULT_PATH_CACHE_SIZE))
 
     def factory(app):
         return AutoContainerMiddleware(app, default_account=default_account,
                                        offset=offset, size=size, mask=mask,
-                                       base=base, con_format=con_format)
+                                       base=base, con_format=con_format,
+                                       path_cache_size=path_cache_size)
     return factory
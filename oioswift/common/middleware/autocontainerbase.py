@@ -13,10 +13,29 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from six.moves.urllib.parse import parse_qs, quote_plus
+from six.moves.urllib.parse import quote_plus
 from swift.common.swob import HTTPBadRequest
-from swift.common.utils import config_true_value, split_path
+from swift.common.utils import config_true_value
 from oio.common.autocontainer import ContainerBuilder
+from oioswift.utils import LRUCache, parse_query
+
+
+DEFAULT_PATH_CACHE_SIZE = 10000
+
+
+def _split_first(path):
+    """
+    Split `path` on its first '/', like split_path('/' + path, 1, 2, True)
+    would, without building a new string.
+
+    :returns: the first segment, and the rest of the path
+        (None if there is no '/')
+    :raises ValueError: if the first segment is empty
+    """
+    head, sep, tail = path.partition('/')
+    if not head:
+        raise ValueError('Invalid path: /%s' % path)
+    return head, (tail if sep else None)
 
 
 class AutoContainerBase(object):
@@ -25,40 +44,60 @@ class AutoContainerBase(object):
     BYPASS_HEADER = "X-bypass-autocontainer"
 
     def __init__(self, app, acct,
-                 strip_v1=False, account_first=False, swift3_compat=False):
+                 strip_v1=False, account_first=False, swift3_compat=False,
+                 path_cache_size=DEFAULT_PATH_CACHE_SIZE):
         self.app = app
         self.account = acct
         self.bypass_header_key = ("HTTP_" +
                                   self.BYPASS_HEADER.upper().replace('-', '_'))
+        # Only parse query strings which may hold the bypass parameter
+        # (unless they are percent-encoded)
+        self.bypass_qs_hint = self.BYPASS_QS.split('-')[0]
         self.con_builder = ContainerBuilder()
         self.account_first = account_first
         self.swift3_compat = swift3_compat
         self.strip_v1 = strip_v1
+        # Paths already converted, the same objects being often requested
+        self.path_cache = None
+        if path_cache_size > 0:
+            self.path_cache = LRUCache(path_cache_size)
 
     def should_bypass(self, env):
         """Should we bypass this filter?"""
-        header = env.get(self.bypass_header_key, "").lower()
-        query = parse_qs(env.get('QUERY_STRING', "")).get(self.BYPASS_QS, [""])
-        return config_true_value(header) or config_true_value(query[0])
+        if config_true_value(env.get(self.bypass_header_key, "")):
+            return True
+        query_string = env.get('QUERY_STRING', "")
+        if self.bypass_qs_hint not in query_string and \
+                '%' not in query_string:
+            return False
+        query = parse_query(env).get(self.BYPASS_QS, [""])
+        return config_true_value(query[0])
 
     def _convert_path(self, path):
+        if self.path_cache is None:
+            return self._build_path(path)
+        converted = self.path_cache.get(path)
+        if converted is None:
+            converted = self._build_path(path)
+            self.path_cache.set(path, converted)
+        return converted
+
+    def _build_path(self, path):
         account = self.account
         # Remove leading '/' to be consistent with split_path()
         obj = path[1:]
         container = None
 
         if self.strip_v1:
-            version, tail = split_path('/' + obj, 1, 2, True)
+            version, tail = _split_first(obj)
             if version in ('v1', 'v1.0'):
                 obj = tail
 
         if self.account_first:
-            account, tail = split_path('/' + obj, 1, 2, True)
-            obj = tail
+            account, obj = _split_first(obj)
 
         if obj is not None and self.swift3_compat:
-            container, tail = split_path('/' + obj, 1, 2, True)
-            obj = tail
+            container, obj = _split_first(obj)
 
         if obj is None:
             return account, container, None
@@ -13,14 +13,136 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from swift.common.utils import config_true_value
-from oioswift.common.middleware.autocontainerbase import AutoContainerBase
+import json
+import os
+import time
+from tempfile import mkstemp
+
+import eventlet
+from swift.common.utils import config_true_value, get_logger, mkdirs
+from oioswift.common.middleware.autocontainerbase import AutoContainerBase, \
+    DEFAULT_PATH_CACHE_SIZE
+from oio.common.autocontainer import HashedContainerBuilder
 from oio.common.exceptions import ConfigurationException
 # TODO(jfs): currently in oio.cli, need to adapt as sson as it has been
 #            factorized
 from oio.cli.clientmanager import ClientManager
 
 
+DEFAULT_FLATNS_REFRESH_INTERVAL = 3600.0
+
+# Flat namespace builders, shared by all the middlewares of the process,
+# and by the workers forked after the pipeline has been loaded once.
+_FLATNS_BUILDERS = dict()
+
+
+def load_flatns_conf(ns, proxy):
+    """Ask the oio-proxy for the flat namespace configuration."""
+    climgr = ClientManager({
+        "namespace": ns,
+        "proxyd_url": proxy,
+    })
+    builder = climgr.get_flatns_manager()
+    return {'offset': builder.offset, 'size': builder.size,
+            'bits': builder.bits}
+
+
+class SharedFlatNsBuilder(object):
+    """
+    Flat namespace container builder, whose configuration is saved in
+    `cache_path` (if set) to be loaded without asking the oio-proxy when
+    the workers restart, and refreshed in the background every
+    `refresh_interval` seconds.
+    """
+
+    def __init__(self, ns, proxy, cache_path=None,
+                 refresh_interval=DEFAULT_FLATNS_REFRESH_INTERVAL,
+                 logger=None):
+        self.ns = ns
+        self.proxy = proxy
+        self.cache_path = cache_path
+        self.refresh_interval = refresh_interval
+        self.logger = logger or get_logger(None, log_route='hashedcontainer')
+        self.conf = None
+        self.builder = None
+        # Incremented each time the configuration changes
+        self.generation = 0
+        self.loaded_at = 0.0
+        self._refresher = None
+        if not self._load_cache():
+            self.refresh()
+
+    def _set_conf(self, conf, loaded_at=None):
+        if conf != self.conf:
+            self.conf = conf
+            self.builder = HashedContainerBuilder(**conf)
+            self.generation += 1
+        self.loaded_at = loaded_at or time.time()
+
+    def _load_cache(self):
+        if not self.cache_path:
+            return False
+        try:
+            with open(self.cache_path, 'r') as cache:
+                conf = json.load(cache)
+            mtime = os.path.getmtime(self.cache_path)
+        except (IOError, OSError, ValueError):
+            return False
+        self._set_conf(conf, loaded_at=mtime)
+        return True
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        dirname = os.path.dirname(self.cache_path) or '.'
+        try:
+            mkdirs(dirname)
+            fd, tmp_path = mkstemp(dir=dirname, prefix='.')
+            try:
+                with os.fdopen(fd, 'w') as cache:
+                    json.dump(self.conf, cache)
+                os.rename(tmp_path, self.cache_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except (IOError, OSError) as err:
+            self.logger.warning('Failed to save the flat namespace '
+                                'configuration to %s: %s',
+                                self.cache_path, err)
+
+    def refresh(self):
+        """Load the configuration from the oio-proxy."""
+        self._set_conf(load_flatns_conf(self.ns, self.proxy))
+        self._save_cache()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as err:
+            # Try again later
+            self.loaded_at = time.time()
+            self.logger.warning('Failed to refresh the flat namespace '
+                                'configuration: %s', err)
+        finally:
+            self._refresher = None
+
+    def __call__(self, path):
+        if self._refresher is None and \
+                self.loaded_at + self.refresh_interval < time.time():
+            self._refresher = eventlet.spawn(self._refresh_in_background)
+        return self.builder(path)
+
+
+def get_flatns_builder(ns, proxy, **kwargs):
+    """Get the SharedFlatNsBuilder of the namespace, creating it if needed."""
+    key = (ns, proxy, kwargs.get('cache_path'))
+    builder = _FLATNS_BUILDERS.get(key)
+    if builder is None:
+        builder = SharedFlatNsBuilder(ns, proxy, **kwargs)
+        _FLATNS_BUILDERS[key] = builder
+    return builder
+
+
 class HashedContainerMiddleware(AutoContainerBase):
 
     BYPASS_QS = "bypass-autocontainer"
@@ -28,14 +150,25 @@ class HashedContainerMiddleware(AutoContainerBase):
     TRUE_VALUES = ["true", "yes", "1"]
 
     def __init__(self, app, ns, acct, proxy,
-                 strip_v1=False, account_first=False):
+                 strip_v1=False, account_first=False,
+                 path_cache_size=DEFAULT_PATH_CACHE_SIZE,
+                 flatns_cache_path=None,
+                 flatns_refresh_interval=DEFAULT_FLATNS_REFRESH_INTERVAL):
         super(HashedContainerMiddleware, self).__init__(
-            app, acct, strip_v1=strip_v1, account_first=account_first)
-        climgr = ClientManager({
-            "namespace": ns,
-            "proxyd_url": proxy,
-        })
-        self.con_builder = climgr.get_flatns_manager()
+            app, acct, strip_v1=strip_v1, account_first=account_first,
+            path_cache_size=path_cache_size)
+        self.con_builder = get_flatns_builder(
+            ns, proxy, cache_path=flatns_cache_path,
+            refresh_interval=flatns_refresh_interval)
+        self._builder_generation = self.con_builder.generation
+
+    def _convert_path(self, path):
+        if self._builder_generation != self.con_builder.generation:
+            # The configuration has changed, forget the converted paths
+            self._builder_generation = self.con_builder.generation
+            if self.path_cache is not None:
+                self.path_cache.clear()
+        return super(HashedContainerMiddleware, self)._convert_path(path)
 
 
 def filter_factory(global_conf, **local_config):
@@ -55,9 +188,17 @@ def filter_factory(global_conf, **local_config):
 
     strip_v1 = config_true_value(local_config.get('strip_v1'))
     account_first = config_true_value(local_config.get('account_first'))
+    path_cache_size = int(local_config.get('path_cache_size',
+                                           DEFAULT_PATH_CACHE_SIZE))
+    flatns_cache_path = conf.get('flatns_cache_path')
+    flatns_refresh_interval = float(conf.get(
+        'flatns_refresh_interval', DEFAULT_FLATNS_REFRESH_INTERVAL))
 
     def factory(app):
-        return HashedContainerMiddleware(app, ns, acct, proxy,
-                                         strip_v1=strip_v1,
-                                         account_first=account_first)
+        return HashedContainerMiddleware(
+            app, ns, acct, proxy,
+            strip_v1=strip_v1, account_first=account_first,
+            path_cache_size=path_cache_size,
+            flatns_cache_path=flatns_cache_path,
+            flatns_refresh_interval=flatns_refresh_interval)
     return factory
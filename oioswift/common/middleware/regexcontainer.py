@@ -13,12 +13,91 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import re
+import sre_parse
+from sre_constants import AT, AT_BEGINNING
+
 from swift.common.utils import config_true_value, get_logger
-from oioswift.common.middleware.autocontainerbase import AutoContainerBase
+from oioswift.common.middleware.autocontainerbase import AutoContainerBase, \
+    DEFAULT_PATH_CACHE_SIZE
 from oio.common.autocontainer import RegexContainerBuilder
 from oio.common.exceptions import ConfigurationException
 
 
+# Python 2 regular expressions cannot have more than 100 groups
+MAX_GROUPS = 99
+
+# Constructs which cannot be combined with other patterns:
+# backreferences, conditional group references, named groups, global flags
+# (patterns with too many groups are not combined either)
+_UNCOMBINABLE = re.compile(r'\\[1-9]|\(\?\(|\(\?P|\(\?[a-zA-Z]')
+
+
+def _is_anchored(pattern):
+    """Tell if `pattern` can only match at the beginning of a string."""
+    parsed = sre_parse.parse(pattern)
+    return len(parsed) > 0 and parsed[0] == (AT, AT_BEGINNING)
+
+
+class CombinedRegexContainerBuilder(object):
+    """
+    Same as RegexContainerBuilder, but consecutive patterns anchored with
+    `^` are combined into a single regular expression, so a single match()
+    call tells which pattern is the first one to match a path, and gives
+    its groups.
+
+    Each anchored pattern becomes an alternative `(?:pattern)()`, the empty
+    group closing the alternative telling (through `lastindex`) which
+    pattern has matched. Patterns which are not anchored, or cannot be
+    combined, are searched separately, in order: search() finds them
+    faster than a combined expression would.
+    """
+
+    def __init__(self, patterns, builder=''.join):
+        self.patterns = list(patterns)
+        self.builder = builder
+        # Lists of (compiled pattern, {lastindex: (first group, count)}),
+        # the dict being None for a pattern matched alone
+        self.regexes = []
+        alternatives = []
+        slices = dict()
+        group = 0
+        for pattern in self.patterns:
+            compiled = re.compile(pattern)
+            if _UNCOMBINABLE.search(pattern) or \
+                    compiled.groups + 1 > MAX_GROUPS or \
+                    not _is_anchored(pattern):
+                self._add_regex(alternatives, slices)
+                alternatives, slices, group = [], dict(), 0
+                self.regexes.append((compiled, None))
+                continue
+            if group + compiled.groups + 1 > MAX_GROUPS:
+                self._add_regex(alternatives, slices)
+                alternatives, slices, group = [], dict(), 0
+            alternatives.append(r'(?:%s)()' % pattern)
+            slices[group + compiled.groups + 1] = (group, compiled.groups)
+            group += compiled.groups + 1
+        self._add_regex(alternatives, slices)
+
+    def _add_regex(self, alternatives, slices):
+        if alternatives:
+            self.regexes.append(
+                (re.compile('|'.join(alternatives)), slices))
+
+    def __call__(self, path):
+        for regex, slices in self.regexes:
+            if slices is None:
+                match = regex.search(path)
+                if match:
+                    return self.builder(match.groups())
+                continue
+            match = regex.match(path)
+            if match:
+                first, count = slices[match.lastindex]
+                return self.builder(match.groups()[first:first + count])
+        raise ValueError("'%s' does not match any pattern" % path)
+
+
 class RegexContainerMiddleware(AutoContainerBase):
 
     BYPASS_QS = "bypass-autocontainer"
@@ -28,7 +107,10 @@ class RegexContainerMiddleware(AutoContainerBase):
                  **kwargs):
         super(RegexContainerMiddleware, self).__init__(
             app, acct, **kwargs)
-        self.con_builder = RegexContainerBuilder(patterns)
+        try:
+            self.con_builder = CombinedRegexContainerBuilder(patterns)
+        except re.error:
+            self.con_builder = RegexContainerBuilder(patterns)
 
 
 def filter_factory(global_conf, **local_config):
@@ -43,6 +125,8 @@ def filter_factory(global_conf, **local_config):
     account_first = config_true_value(local_config.get('account_first'))
     swift3_compat = config_true_value(local_config.get('swift3_compat'))
     strip_v1 = config_true_value(local_config.get('strip_v1'))
+    path_cache_size = int(local_config.get('path_cache_size',
+                                           DEFAULT_PATH_CACHE_SIZE))
     pattern_dict = {k: v for k, v in local_config.items()
                     if k.startswith("pattern")}
 
@@ -53,5 +137,5 @@ def filter_factory(global_conf, **local_config):
         return RegexContainerMiddleware(
             app, acct, patterns,
             strip_v1=strip_v1, account_first=account_first,
-            swift3_compat=swift3_compat)
+            swift3_compat=swift3_compat, path_cache_size=path_cache_size)
     return factory
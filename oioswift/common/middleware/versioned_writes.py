@@ -14,29 +14,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from six.moves.urllib.parse import parse_qs, quote, unquote, urlencode
+from six.moves.urllib.parse import quote, unquote, urlencode
 from swift.common.middleware import versioned_writes as vw
-from swift.common.swob import Request, HTTPException
-from swift.common.utils import config_true_value, json, \
-    register_swift_info, split_path
+from swift.common.swob import Request, HTTPBadRequest, HTTPException
+from swift.common.utils import config_true_value, register_swift_info, \
+    split_path
 from swift.proxy.controllers.base import get_container_info, get_object_info
 
-
-VERSIONING_SUFFIX = '+versioning'
-
-
-def swift3_versioned_object_name(object_name, version_id=None):
-    if version_id is not None:
-        version_id = '/%s' % version_id
-    return '%03x%s%s' % (len(object_name), object_name, version_id)
+from oioswift.utils import parse_query, swift3_split_object_name_version
+# Moved to oioswift.utils, still importable from here
+from oioswift.utils import swift3_versioned_object_name  # noqa
 
 
-def swift3_split_object_name_version(object_name):
-    if '/' not in object_name or \
-            len(object_name) < 3 or \
-            not object_name[:3].isdigit():
-        return object_name, None
-    return object_name[3:].rsplit('/', 1)
+VERSIONING_SUFFIX = '+versioning'
 
 
 def get_unversioned_container(container):
@@ -67,31 +57,30 @@ class OioVersionedWritesContext(vw.VersionedWritesContext):
                 orig_container = container_name
 
         if orig_container != container_name:
-            qs = parse_qs(sub_env.get('QUERY_STRING', ''))
+            # Copy the parsed query, which is shared
+            qs = dict(parse_query(sub_env))
             if 'marker' in qs:
                 marker, _ = swift3_split_object_name_version(qs['marker'][0])
                 qs['marker'] = [marker]
+            # The container controller lists all the versions, and names
+            # them with swift3_versioned_object_name()
+            oio_query = {'versions': True, 'versioned_names': True}
+            if 'max_versions' in qs:
+                # Only list the most recent versions of each object
+                try:
+                    oio_query['max_versions'] = int(
+                        qs.pop('max_versions')[0])
+                    if oio_query['max_versions'] < 1:
+                        raise ValueError()
+                except ValueError:
+                    raise HTTPBadRequest(
+                        request=Request(env), content_type='text/plain',
+                        body='max_versions must be a positive integer')
             sub_env['QUERY_STRING'] = urlencode(qs, True)
-            sub_env['oio_query'] = {'versions': True}
-
-        resp = super(OioVersionedWritesContext, self).handle_container_request(
-            sub_env, lambda x, y, z: None)
-
-        if orig_container != container_name and \
-                self._response_status == '200 OK':
-            versioned_objects = json.loads("".join(resp))
-            for obj in versioned_objects:
-                obj['name'] = swift3_versioned_object_name(
-                    obj['name'], obj.get('version', ''))
-            # XXX: we may need to filter the most recent version
-            resp = json.dumps(versioned_objects)
-            self._response_headers = [x for x in self._response_headers
-                                      if x[0] != 'Content-Length']
-            self._response_headers.append(('Content-Length', str(len(resp))))
-
-        start_response(self._response_status, self._response_headers,
-                       self._response_exc_info)
-        return resp
+            sub_env['oio_query'] = oio_query
+
+        return super(OioVersionedWritesContext, self).handle_container_request(
+            sub_env, start_response)
 
     def handle_container_request(self, env, start_response):
         method = env.get('REQUEST_METHOD')
@@ -0,0 +1,114 @@
+# Copyright (c) 2017 OpenIO SAS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import errno
+import os
+from hashlib import md5
+from tempfile import mkstemp
+
+import eventlet
+from eventlet import tpool
+from swift.common.utils import mkdirs
+
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+
+class RangeCache(object):
+    """
+    Cache fixed-size blocks of object data as files below `path`.
+
+    The files are shared by all the workers of the node (put `path` on
+    a tmpfs like /dev/shm to keep them in memory). When a worker has
+    written a tenth of `size` bytes, it removes the least recently used
+    blocks until the cache fits in `size` bytes again, in a native thread
+    so the requests of the worker are not blocked meanwhile.
+    """
+
+    def __init__(self, path, size, block_size=DEFAULT_BLOCK_SIZE):
+        self.path = path
+        self.size = size
+        self.block_size = block_size
+        self._written = 0
+        self._cleaner = None
+
+    def _block_path(self, key, index):
+        name = md5('/'.join(str(k) for k in key) +
+                   '/%d' % index).hexdigest()
+        return os.path.join(self.path, name[-3:], name)
+
+    def get(self, key, index):
+        """
+        Get block number `index` of the object identified by `key`
+        (account, container, object and version).
+
+        :returns: the data of the block, or None if not cached
+        """
+        path = self._block_path(key, index)
+        try:
+            with open(path, 'rb') as block:
+                data = block.read()
+            # Keep track of the last access for the cleanup
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        return data
+
+    def put(self, key, index, data):
+        """Save block number `index` of the object identified by `key`."""
+        path = self._block_path(key, index)
+        dirname = os.path.dirname(path)
+        try:
+            mkdirs(dirname)
+            fd, tmp_path = mkstemp(dir=dirname, prefix='.')
+            try:
+                with os.fdopen(fd, 'wb') as block:
+                    block.write(data)
+                os.rename(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except (IOError, OSError):
+            # Caching is best effort
+            return
+        self._written += len(data)
+        if self._written * 10 >= self.size:
+            self._written = 0
+            if self._cleaner is None or self._cleaner.dead:
+                self._cleaner = eventlet.spawn(tpool.execute, self.cleanup)
+
+    def cleanup(self):
+        """Remove the least recently used blocks exceeding the size."""
+        blocks = list()
+        total = 0
+        for dirpath, _dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                blocks.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        blocks.sort()
+        for _mtime, size, path in blocks:
+            if total <= self.size:
+                break
+            try:
+                os.unlink(path)
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    continue
+            total -= size
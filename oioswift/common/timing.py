@@ -0,0 +1,169 @@
+# Copyright (c) 2017 OpenIO SAS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from functools import partial
+
+from eventlet.corolocal import local
+
+
+TIMING_ENV_KEY = 'oio.timing'
+TIMING_HEADER = 'X-Oio-Timing'
+
+# Sub-clients of ObjectStorageApi called directly by the controllers
+SUB_CLIENTS = ('account', 'container')
+
+
+class RequestTiming(object):
+    """
+    Time spent in the storage backend while handling a request,
+    saved in the request environ under `oio.timing`.
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        # (operation, seconds) of each backend call
+        self.calls = list()
+        self.first_byte = None
+        self.last_byte = None
+
+    def header_value(self):
+        """
+        Format the timings (in milliseconds) for the X-Oio-Timing header.
+        The total is the time elapsed since the beginning of the request.
+        """
+        parts = ['%s=%.3f' % (name, duration * 1000.0)
+                 for name, duration in self.calls]
+        parts.append('total=%.3f' % ((time.time() - self.start) * 1000.0))
+        return ', '.join(parts)
+
+
+class TimedStream(object):
+    """
+    Wrap a data stream of the storage backend, to record when its first
+    and last bytes are received, relatively to the start of the request.
+    """
+
+    def __init__(self, stream, timing, logger, name='object_fetch'):
+        self.stream = stream
+        self.timing = timing
+        self.logger = logger
+        self.name = name
+        self._iter = iter(stream)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        try:
+            data = next(self._iter)
+        except StopIteration:
+            if self.timing.last_byte is None:
+                self.timing.last_byte = time.time() - self.timing.start
+                self.logger.timing(
+                    'storage.%s.last_byte.timing' % self.name,
+                    self.timing.last_byte * 1000.0)
+            raise
+        if self.timing.first_byte is None:
+            self.timing.first_byte = time.time() - self.timing.start
+            self.logger.timing('storage.%s.first_byte.timing' % self.name,
+                               self.timing.first_byte * 1000.0)
+        return data
+
+    __next__ = next
+
+    def close(self):
+        if hasattr(self.stream, 'close'):
+            self.stream.close()
+
+
+class TimedStorage(object):
+    """
+    Proxy to the storage API, timing the calls to its methods.
+
+    Each call is sent to statsd as `storage.<method>.<status>.timing`,
+    `status` being `ok` or the name of the exception raised. It is also
+    recorded in the RequestTiming of the request handled by the current
+    green thread, if any (see `start_request`).
+    """
+
+    def __init__(self, storage, logger, _prefix='', _local=None):
+        self.storage = storage
+        self.logger = logger
+        self._prefix = _prefix
+        self._local = _local if _local is not None else local()
+
+    def __getattr__(self, name):
+        attr = getattr(self.storage, name)
+        if name in SUB_CLIENTS and not self._prefix:
+            return TimedStorage(attr, self.logger,
+                                _prefix=name + '.', _local=self._local)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        return partial(self._timed_call, self._prefix + name, attr)
+
+    def _timed_call(self, name, func, *args, **kwargs):
+        status = 'ok'
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        except Exception as exc:
+            status = type(exc).__name__
+            raise
+        finally:
+            duration = time.time() - start
+            self.logger.timing('storage.%s.%s.timing' % (name, status),
+                               duration * 1000.0)
+            timing = getattr(self._local, 'timing', None)
+            if timing is not None:
+                timing.calls.append((name, duration))
+
+    def start_request(self, env):
+        """
+        Record the calls made by the current green thread in the
+        RequestTiming of `env`, until `end_request` is called.
+
+        :returns: the RequestTiming of the request handled before
+            (subrequests are handled by the same green thread)
+        """
+        previous = getattr(self._local, 'timing', None)
+        timing = env.get(TIMING_ENV_KEY)
+        if timing is None:
+            timing = env[TIMING_ENV_KEY] = RequestTiming()
+        self._local.timing = timing
+        return previous
+
+    def bind(self, func):
+        """
+        Wrap `func`, so the calls it makes are recorded in the
+        RequestTiming of the current request, even when it is run by
+        another green thread.
+        """
+        timing = getattr(self._local, 'timing', None)
+        if timing is None:
+            return func
+
+        def _bound(*args, **kwargs):
+            previous = getattr(self._local, 'timing', None)
+            self._local.timing = timing
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.timing = previous
+        return _bound
+
+    def end_request(self, previous=None):
+        """Stop recording the calls of the current request."""
+        self._local.timing = previous
@@ -15,23 +15,47 @@
 # limitations under the License.
 
 import time
+from collections import OrderedDict
+from functools import partial
 from xml.sax import saxutils
 
+import eventlet
+from eventlet import GreenPool
+from six.moves.urllib.parse import quote, unquote
+from swift.common.middleware.bulk import ACCEPTABLE_FORMATS, \
+    get_response_body
+from swift.common.http import is_server_error, is_success, \
+    HTTP_CONFLICT, HTTP_INTERNAL_SERVER_ERROR, \
+    HTTP_NO_CONTENT, HTTP_NOT_FOUND, HTTP_PRECONDITION_FAILED, \
+    HTTP_UNAUTHORIZED
 from swift.common.request_helpers import get_listing_content_type
-from swift.common.utils import public, Timestamp, json
+from swift.common.utils import public, Timestamp, json, \
+    get_valid_utf8_str
 from swift.common.constraints import check_metadata
 from swift.common import constraints
 from swift.common.swob import HTTPBadRequest, HTTPMethodNotAllowed
 from swift.common.request_helpers import get_param, is_sys_or_user_meta
 from swift.common.swob import HTTPNoContent, HTTPOk, HTTPPreconditionFailed, \
-    HTTPNotFound, HTTPCreated, HTTPAccepted
+    HTTPNotFound, HTTPCreated, HTTPAccepted, HTTPBadGateway, \
+    HTTPException, HTTPLengthRequired, HTTPNotAcceptable, \
+    HTTPRequestEntityTooLarge, HTTPServerError, HTTPUnauthorized, Request, \
+    RESPONSE_REASONS
 from swift.proxy.controllers.account import AccountController \
         as SwiftAccountController
-from swift.proxy.controllers.base import set_info_cache, clear_info_cache
+from swift.proxy.controllers.base import set_info_cache, delay_denial
 
 from oio.common import exceptions
 
-from oioswift.utils import handle_service_busy
+from oioswift.utils import buffered_iter, clear_account_cache, \
+    clear_container_cache, handle_service_busy, iter_pages
+
+
+# Same limits as the bulk middleware
+MAX_DELETES_PER_REQUEST = 10000
+MAX_PATH_LENGTH = constraints.MAX_CONTAINER_NAME_LENGTH + \
+    constraints.MAX_OBJECT_NAME_LENGTH + 2
+# Seconds between whitespaces sent to keep the connection alive
+BULK_YIELD_FREQUENCY = 10
 
 
 def get_response_headers(info):
@@ -49,8 +73,70 @@ def get_response_headers(info):
     return resp_headers
 
 
+def refresh_account_info(app, account, entry):
+    """
+    Replace `entry` in the account info cache by up-to-date information,
+    unless it has been dropped or replaced meanwhile (the account may have
+    been modified since the information was fetched).
+    Meant to be run in a green thread.
+    """
+    cache = app.account_info_cache
+    try:
+        info = app.storage.account_show(account)
+    except (exceptions.NotFound, exceptions.NoSuchAccount):
+        if cache.get(account) is entry:
+            cache.pop(account)
+    except Exception:
+        app.logger.exception('ERROR refreshing info of account %s', account)
+        # Let another request retry
+        entry['refresh'] = None
+    else:
+        if cache.get(account) is entry:
+            cache.set(account,
+                      {'info': info, 'time': time.time(), 'refresh': None})
+
+
+def iter_account_listing(account, response_content_type, listing):
+    """
+    Serialize `listing` as it is iterated, producing the same output
+    as account_listing_response.
+    """
+    if response_content_type == 'application/json':
+        yield '['
+        for i, (name, object_count, bytes_used, is_subdir) in \
+                enumerate(listing):
+            if is_subdir:
+                item = {'subdir': name}
+            else:
+                item = {'name': name, 'count': object_count,
+                        'bytes': bytes_used}
+            yield (', ' if i else '') + json.dumps(item)
+        yield ']'
+    elif response_content_type.endswith('/xml'):
+        yield '<?xml version="1.0" encoding="UTF-8"?>'
+        yield get_valid_utf8_str(
+            '\n<account name=%s>' % saxutils.quoteattr(account))
+        for (name, object_count, bytes_used, is_subdir) in listing:
+            if is_subdir:
+                item = '\n<subdir name=%s />' % saxutils.quoteattr(name)
+            else:
+                item = '\n<container><name>%s</name><count>%s</count>' \
+                       '<bytes>%s</bytes></container>' % \
+                       (saxutils.escape(name), object_count, bytes_used)
+            yield get_valid_utf8_str(item)
+        yield '\n</account>'
+    else:
+        for record in listing:
+            yield get_valid_utf8_str(record[0]) + '\n'
+
+
 def account_listing_response(account, req, response_content_type,
-                             info=None, listing=None):
+                             info=None, listing=None, chunk_size=None):
+    """
+    Build the response to an account listing request. When `chunk_size`
+    is set, the listing (which may then be an iterator) is streamed in
+    chunks of at least `chunk_size` bytes.
+    """
     if info is None:
         now = Timestamp(time.time()).internal
         info = {'containers': 0,
@@ -63,7 +149,18 @@ def account_listing_response(account, req, response_content_type,
 
     resp_headers = get_response_headers(info)
 
-    if response_content_type == 'application/json':
+    if chunk_size:
+        if not listing and response_content_type != 'application/json' \
+                and not response_content_type.endswith('/xml'):
+            resp = HTTPNoContent(request=req, headers=resp_headers)
+            resp.content_type = response_content_type
+            resp.charset = 'utf-8'
+            return resp
+        ret = HTTPOk(request=req, headers=resp_headers)
+        ret.app_iter = buffered_iter(
+            iter_account_listing(account, response_content_type, listing),
+            chunk_size)
+    elif response_content_type == 'application/json':
         data = []
         for (name, object_count, bytes_used, is_subdir) in listing:
             if is_subdir:
@@ -72,6 +169,7 @@ def account_listing_response(account, req, response_content_type,
                 data.append({'name': name, 'count': object_count,
                              'bytes': bytes_used})
         account_list = json.dumps(data)
+        ret = HTTPOk(body=account_list, request=req, headers=resp_headers)
     elif response_content_type.endswith('/xml'):
         output_list = ['<?xml version="1.0" encoding="UTF-8"?>',
                        '<account name=%s>' % saxutils.quoteattr(account)]
@@ -86,6 +184,7 @@ def account_listing_response(account, req, response_content_type,
                 output_list.append(item)
         output_list.append('</account>')
         account_list = '\n'.join(output_list)
+        ret = HTTPOk(body=account_list, request=req, headers=resp_headers)
     else:
         if not listing:
             resp = HTTPNoContent(request=req, headers=resp_headers)
@@ -93,7 +192,7 @@ def account_listing_response(account, req, response_content_type,
             resp.charset = 'utf-8'
             return resp
         account_list = '\n'.join(r[0] for r in listing) + '\n'
-    ret = HTTPOk(body=account_list, request=req, headers=resp_headers)
+        ret = HTTPOk(body=account_list, request=req, headers=resp_headers)
     ret.content_type = response_content_type
     ret.charset = 'utf-8'
     return ret
@@ -123,40 +222,55 @@ class AccountController(SwiftAccountController):
 
     def get_account_listing_resp(self, req):
         prefix = get_param(req, 'prefix')
-        delimiter = get_param(req, 'prefix')
+        delimiter = get_param(req, 'delimiter')
         if delimiter and (len(delimiter) > 1 or ord(delimiter) > 254):
             return HTTPPreconditionFailed(body='Bad delimiter')
         limit = constraints.ACCOUNT_LISTING_LIMIT
+        max_limit = max(limit, self.app.account_listing_max_limit)
         given_limit = get_param(req, 'limit')
         if given_limit and given_limit.isdigit():
             limit = int(given_limit)
-            if limit > constraints.ACCOUNT_LISTING_LIMIT:
+            if limit > max_limit:
                 return HTTPPreconditionFailed(
                     request=req,
-                    body='Maximum limit is %d' %
-                         constraints.ACCOUNT_LISTING_LIMIT)
+                    body='Maximum limit is %d' % max_limit)
         marker = get_param(req, 'marker')
         end_marker = get_param(req, 'end_marker')
+        storage = self.app.storage
 
-        try:
-            info = None
-            if hasattr(self.app.storage, 'account'):
+        def list_page(page_marker, page_limit):
+            if hasattr(storage, 'account'):
                 # Call directly AccountClient.container_list()
-                info = self.app.storage.account.container_list(
-                    self.account_name, limit=limit, marker=marker,
+                info = storage.account.container_list(
+                    self.account_name, limit=page_limit, marker=page_marker,
                     end_marker=end_marker, prefix=prefix,
                     delimiter=delimiter)
                 listing = info.pop('listing')
             else:
                 # Legacy call to account service
-                listing, info = self.app.storage.container_list(
-                    self.account_name, limit=limit, marker=marker,
+                listing, info = storage.container_list(
+                    self.account_name, limit=page_limit, marker=page_marker,
                     end_marker=end_marker, prefix=prefix,
                     delimiter=delimiter)
+            return {'listing': listing, 'info': info,
+                    'truncated': len(listing) >= page_limit}
+
+        if self.app.stream_listings:
+            chunk_size = self.app.client_chunk_size
+        else:
+            chunk_size = None
+        try:
+            page = list_page(
+                marker, min(limit, constraints.ACCOUNT_LISTING_LIMIT))
+            listing = page['listing']
+            if self.app.account_listing_max_limit > 0 and page['truncated']:
+                listing = self.paginate_listing(
+                    page, list_page, limit, delimiter)
             resp = account_listing_response(self.account_name, req,
                                             get_listing_content_type(req),
-                                            info=info,
-                                            listing=listing)
+                                            info=page['info'],
+                                            listing=listing,
+                                            chunk_size=chunk_size)
         except (exceptions.NotFound, exceptions.NoSuchAccount):
             if self.app.account_autocreate:
                 resp = account_listing_response(self.account_name, req,
@@ -165,6 +279,30 @@ class AccountController(SwiftAccountController):
                 resp = HTTPNotFound(request=req)
         return resp
 
+    def paginate_listing(self, page, list_page, limit, delimiter=None):
+        """
+        Chain the backend listing pages following `page`, until `limit`
+        containers have been listed or the backend has nothing more to list.
+        The next page is requested while the current one is serialized.
+        """
+        listed = [0]
+
+        def next_page(page):
+            listed[0] += len(page['listing'])
+            if not page['truncated'] or listed[0] >= limit:
+                return None
+            name, _count, _bytes, is_subdir = page['listing'][-1]
+            if is_subdir and delimiter and name.endswith(delimiter):
+                # Skip everything below the last prefix
+                name = name[:-1] + chr(ord(delimiter) + 1)
+            return list_page(
+                name,
+                min(limit - listed[0], constraints.ACCOUNT_LISTING_LIMIT))
+
+        for page in iter_pages(page, next_page):
+            for record in page['listing']:
+                yield record
+
     @public
     @handle_service_busy
     def HEAD(self, req):
@@ -187,9 +325,38 @@ class AccountController(SwiftAccountController):
                 resp.headers.pop(header, None)
         return resp
 
+    def get_account_info(self):
+        """
+        Get the information of the account, from the in-process cache if
+        possible. Cached information older than the soft TTL is still
+        served, while being refreshed by a green thread.
+        """
+        cache = self.app.account_info_cache
+        if cache is None:
+            return self.app.storage.account_show(self.account_name)
+        entry = cache.get(self.account_name)
+        if entry is None:
+            self.app.logger.increment('account_info_cache.miss')
+            info = self.app.storage.account_show(self.account_name)
+            evicted = cache.set(self.account_name,
+                                {'info': info, 'time': time.time(),
+                                 'refresh': None})
+            if evicted:
+                self.app.logger.update_stats(
+                    'account_info_cache.eviction', evicted)
+            return info
+        self.app.logger.increment('account_info_cache.hit')
+        if entry['refresh'] is None and \
+                entry['time'] + self.app.account_info_cache_soft_ttl < \
+                time.time():
+            self.app.logger.increment('account_info_cache.refresh')
+            entry['refresh'] = eventlet.spawn(
+                refresh_account_info, self.app, self.account_name, entry)
+        return entry['info']
+
     def get_account_head_resp(self, req):
         try:
-            info = self.app.storage.account_show(self.account_name)
+            info = self.get_account_info()
             resp = account_listing_response(self.account_name, req,
                                             get_listing_content_type(req),
                                             info=info)
@@ -221,7 +388,7 @@ class AccountController(SwiftAccountController):
             return resp
 
         headers = self.generate_request_headers(req, transfer=True)
-        clear_info_cache(self.app, req.environ, self.account_name)
+        clear_account_cache(self.app, req.environ, self.account_name)
         resp = self.get_account_put_resp(req, headers)
         self.add_acls_from_sys_metadata(resp)
         return resp
@@ -243,9 +410,17 @@ class AccountController(SwiftAccountController):
         return resp
 
     @public
+    @delay_denial
     @handle_service_busy
     def POST(self, req):
         """HTTP POST request handler."""
+        if 'bulk-delete' in req.params:
+            return self.get_bulk_delete_resp(req)
+        if 'swift.authorize' in req.environ:
+            # The denial has only been delayed for bulk-delete requests
+            aresp = req.environ['swift.authorize'](req)
+            if aresp:
+                return aresp
         if len(self.account_name) > constraints.MAX_ACCOUNT_NAME_LENGTH:
             resp = HTTPBadRequest(request=req)
             resp.body = 'Account name length of %d longer than %d' % \
@@ -257,7 +432,7 @@ class AccountController(SwiftAccountController):
             return error_response
 
         headers = self.generate_request_headers(req, transfer=True)
-        clear_info_cache(self.app, req.environ, self.account_name)
+        clear_account_cache(self.app, req.environ, self.account_name)
         resp = self.get_account_post_resp(req, headers)
         self.add_acls_from_sys_metadata(resp)
         return resp
@@ -283,9 +458,17 @@ class AccountController(SwiftAccountController):
         return resp
 
     @public
+    @delay_denial
     @handle_service_busy
     def DELETE(self, req):
         """HTTP DELETE request handler."""
+        if 'bulk-delete' in req.params:
+            return self.get_bulk_delete_resp(req)
+        if 'swift.authorize' in req.environ:
+            # The denial has only been delayed for bulk-delete requests
+            aresp = req.environ['swift.authorize'](req)
+            if aresp:
+                return aresp
         if req.query_string:
             return HTTPBadRequest(request=req)
         if not self.app.allow_account_management:
@@ -293,10 +476,193 @@ class AccountController(SwiftAccountController):
                 request=req,
                 headers={'Allow': ', '.join(self.allowed_methods)})
         headers = self.generate_request_headers(req)
-        clear_info_cache(self.app, req.environ, self.account_name)
+        clear_account_cache(self.app, req.environ, self.account_name)
         resp = self.get_account_delete_resp(req, headers)
         return resp
 
     def get_account_delete_resp(self, req, headers):
         # TODO perform delete
         return HTTPNoContent(request=req)
+
+    def get_bulk_delete_resp(self, req):
+        """
+        Delete the objects (and then the containers) listed in the request
+        body, like the bulk middleware does, but calling the backend
+        directly instead of sending a sub-request for each object.
+        """
+        resp = HTTPOk(request=req)
+        out_content_type = req.accept.best_match(ACCEPTABLE_FORMATS)
+        if out_content_type:
+            resp.content_type = out_content_type
+        resp.app_iter = self._iter_bulk_delete(req, out_content_type)
+        return resp
+
+    def _get_names_to_delete(self, req):
+        if req.content_length is None and \
+                req.headers.get('transfer-encoding', '').lower() != 'chunked':
+            raise HTTPLengthRequired(request=req)
+        names = []
+        line = ''
+        while True:
+            data = req.body_file.read(MAX_PATH_LENGTH)
+            line += data
+            lines = line.split('\n')
+            line = lines.pop() if data else ''
+            names.extend(unquote(name.strip())
+                         for name in lines if name.strip())
+            if len(names) > MAX_DELETES_PER_REQUEST:
+                raise HTTPRequestEntityTooLarge(
+                    'Maximum Bulk Deletes: %d per request' %
+                    MAX_DELETES_PER_REQUEST)
+            if len(line) > MAX_PATH_LENGTH * 2:
+                raise HTTPBadRequest('Invalid File Name')
+            if not data:
+                return names
+
+    def _sub_request(self, req, container, obj=None):
+        path = '/'.join(['', req.split_path(2, 3, True)[0],
+                         self.account_name, container])
+        if obj is not None:
+            path += '/' + obj
+        env = req.environ.copy()
+        env['PATH_INFO'] = path
+        env['REQUEST_METHOD'] = 'DELETE'
+        env['CONTENT_LENGTH'] = 0
+        env.pop('wsgi.input', None)
+        return Request.blank(quote(path), env)
+
+    def _bulk_delete_object(self, req, container, obj, write_acl):
+        """
+        :returns: a tuple with the name of the object and the status of
+            its deletion
+        """
+        name = container + '/' + obj
+        if not constraints.check_utf8(name):
+            return name, HTTP_PRECONDITION_FAILED
+        if 'swift.authorize' in req.environ:
+            sub_req = self._sub_request(req, container, obj)
+            sub_req.acl = write_acl
+            aresp = req.environ['swift.authorize'](sub_req)
+            if aresp:
+                return name, aresp.status_int
+        try:
+            self.app.storage.object_delete(self.account_name, container, obj)
+        except (exceptions.NoSuchObject, exceptions.NoSuchContainer):
+            return name, HTTP_NOT_FOUND
+        except Exception:
+            self.app.logger.exception('ERROR bulk-delete of %s', name)
+            return name, HTTP_INTERNAL_SERVER_ERROR
+        finally:
+            if self.app.object_metadata_cache is not None:
+                self.app.object_metadata_cache.pop(
+                    (self.account_name, container, obj))
+        return name, HTTP_NO_CONTENT
+
+    def _bulk_delete_container(self, req, container):
+        if 'swift.authorize' in req.environ:
+            aresp = req.environ['swift.authorize'](
+                self._sub_request(req, container))
+            if aresp:
+                return container, aresp.status_int
+        try:
+            self.app.storage.container_delete(self.account_name, container)
+        except exceptions.ContainerNotEmpty:
+            return container, HTTP_CONFLICT
+        except exceptions.NoSuchContainer:
+            return container, HTTP_NOT_FOUND
+        except Exception:
+            self.app.logger.exception('ERROR bulk-delete of %s', container)
+            return container, HTTP_INTERNAL_SERVER_ERROR
+        finally:
+            clear_container_cache(self.app, req.environ, self.account_name,
+                                  container)
+        return container, HTTP_NO_CONTENT
+
+    def _iter_bulk_delete(self, req, out_content_type):
+        resp_dict = {'Response Status': HTTPOk().status,
+                     'Response Body': '',
+                     'Number Deleted': 0,
+                     'Number Not Found': 0}
+        failed_files = []
+        failed_type = HTTPBadRequest
+        last_yield = time.time()
+        separator = ''
+        try:
+            if not out_content_type:
+                raise HTTPNotAcceptable(request=req)
+            if out_content_type.endswith('/xml'):
+                yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+            incoming_format = req.headers.get('Content-Type')
+            if incoming_format and \
+                    not incoming_format.startswith('text/plain'):
+                raise HTTPNotAcceptable(request=req)
+            req.environ['eventlet.minimum_write_chunk_size'] = 0
+
+            # Objects grouped by container, then containers
+            objects = OrderedDict()
+            containers = []
+            for name in self._get_names_to_delete(req):
+                container, _, obj = name.lstrip('/').partition('/')
+                if obj:
+                    objects.setdefault(container, []).append(obj)
+                elif container:
+                    containers.append(container)
+
+            jobs = []
+            for container, objs in objects.iteritems():
+                info = self.container_info(
+                    self.account_name, container, req)
+                jobs.extend((container, obj, info) for obj in objs)
+
+            def _delete_object(container, obj, info):
+                if not is_success(info['status']):
+                    # The container does not exist
+                    return container + '/' + obj, HTTP_NOT_FOUND
+                return self._bulk_delete_object(
+                    req, container, obj, info['write_acl'])
+
+            pool = GreenPool(self.app.bulk_concurrency)
+
+            def _results():
+                for result in pool.starmap(_delete_object, jobs):
+                    yield result
+                # The containers may only be empty once all the
+                # objects have been deleted
+                for result in pool.imap(
+                        partial(self._bulk_delete_container, req),
+                        containers):
+                    yield result
+
+            for name, status in _results():
+                if last_yield + BULK_YIELD_FREQUENCY < time.time():
+                    separator = '\r\n\r\n'
+                    last_yield = time.time()
+                    yield ' '
+                if is_success(status):
+                    resp_dict['Number Deleted'] += 1
+                elif status == HTTP_NOT_FOUND:
+                    resp_dict['Number Not Found'] += 1
+                elif status == HTTP_UNAUTHORIZED:
+                    failed_files.append(
+                        [quote(name), HTTPUnauthorized().status])
+                else:
+                    if is_server_error(status):
+                        failed_type = HTTPBadGateway
+                    failed_files.append([quote(name), '%d %s' % (
+                        status, RESPONSE_REASONS[status][0])])
+
+            if failed_files:
+                resp_dict['Response Status'] = failed_type().status
+            elif not (resp_dict['Number Deleted'] or
+                      resp_dict['Number Not Found']):
+                resp_dict['Response Status'] = HTTPBadRequest().status
+                resp_dict['Response Body'] = 'Invalid bulk delete.'
+        except HTTPException as err:
+            resp_dict['Response Status'] = err.status
+            resp_dict['Response Body'] = err.body
+        except Exception:
+            self.app.logger.exception('Error in bulk delete.')
+            resp_dict['Response Status'] = HTTPServerError().status
+
+        yield separator + get_response_body(out_content_type,
+                                            resp_dict, failed_files)
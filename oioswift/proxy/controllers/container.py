@@ -15,6 +15,9 @@
 # limitations under the License.
 
 import json
+from itertools import chain
+from eventlet import GreenPool
+from xml.sax import saxutils
 from xml.etree.cElementTree import Element, SubElement, tostring
 
 from swift.common.utils import public, Timestamp, \
@@ -24,17 +27,102 @@ from swift.common import constraints
 from swift.common.middleware.versioned_writes import DELETE_MARKER_CONTENT_TYPE
 from swift.common.swob import Response, HTTPBadRequest, HTTPNotFound, \
     HTTPNoContent, HTTPConflict, HTTPPreconditionFailed, HTTPForbidden, \
-    HTTPCreated
+    HTTPCreated, HTTPOk, HTTPRequestEntityTooLarge
 from swift.common.http import is_success, HTTP_ACCEPTED
-from swift.common.request_helpers import is_sys_or_user_meta, get_param
+from swift.common.request_helpers import is_sys_or_user_meta, \
+    is_user_meta, get_param
 from swift.proxy.controllers.container import ContainerController \
         as SwiftContainerController
-from swift.proxy.controllers.base import clear_info_cache, \
-    delay_denial, cors_validation, set_info_cache
+from swift.proxy.controllers.base import delay_denial, cors_validation, \
+    set_info_cache
 
 from oio.common import exceptions
 
-from oioswift.utils import get_listing_content_type, handle_service_busy
+from oioswift.utils import buffered_iter, clear_container_cache, \
+    get_container_cache_entry, get_listing_content_type, \
+    handle_service_busy, iter_pages, swift3_versioned_object_name
+
+
+def _utf8(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def _xml_text(value):
+    return saxutils.escape(_utf8(value))
+
+
+def _xml_attr(value):
+    return '"%s"' % saxutils.escape(_utf8(value),
+                                    {'"': '&quot;', '\n': '&#10;'})
+
+
+def _xml_element(tag, value):
+    # Like ElementTree, which does not close elements without text
+    text = _xml_text(value)
+    if not text:
+        return '<%s />' % tag
+    return '<%s>%s</%s>' % (tag, text, tag)
+
+
+def _next_marker(page, delimiter=None):
+    if page.get('next_marker'):
+        return page['next_marker']
+    names = []
+    if page['objects']:
+        names.append(page['objects'][-1]['name'])
+    if page.get('prefixes'):
+        # Skip everything below the last prefix
+        prefix = page['prefixes'][-1]
+        if delimiter and prefix.endswith(delimiter):
+            prefix = prefix[:-1] + chr(ord(delimiter) + 1)
+        names.append(prefix)
+    return max(names)
+
+
+def _hold_last_versions(page, max_versions, delimiter=None):
+    """
+    Drop the versions of the last object of the truncated listing page
+    `page` (the backend may have more of them on the next page), unless
+    enough of them are on this page. They will be listed again, with
+    all their versions, from the marker returned.
+
+    :returns: the objects to keep, and the marker of the next page
+    """
+    objects = page['objects']
+    marker = _next_marker(page, delimiter)
+    if not objects or objects[-1]['name'] != marker:
+        # The backend listed past the last object
+        return objects, marker
+    first = len(objects) - 1
+    while first > 0 and objects[first - 1]['name'] == marker:
+        first -= 1
+    held = {'objects': objects[:first], 'prefixes': page.get('prefixes')}
+    if len(objects) - first >= max_versions or \
+            not (held['objects'] or held['prefixes']):
+        # Nothing before the object to resume from: the backend
+        # markers cannot point in the middle of its versions.
+        return objects, marker
+    return held['objects'], _next_marker(held, delimiter)
+
+
+def _keep_latest_versions(objects, max_versions, last):
+    """
+    Keep the `max_versions` most recent versions of each object of the
+    listing page `objects` (sorted by name, then from the most recent
+    version). `last` holds the name of the last object seen and the
+    number of its versions, carried from a page to the next one.
+    """
+    kept = []
+    for obj in objects:
+        if obj['name'] != last['name']:
+            last['name'] = obj['name']
+            last['count'] = 0
+        last['count'] += 1
+        if last['count'] <= max_versions:
+            kept.append(obj)
+    return kept
 
 
 class ContainerController(SwiftContainerController):
@@ -118,14 +206,14 @@ class ContainerController(SwiftContainerController):
         marker = get_param(req, 'marker', '')
         end_marker = get_param(req, 'end_marker')
         limit = constraints.CONTAINER_LISTING_LIMIT
+        max_limit = max(limit, self.app.container_listing_max_limit)
         given_limit = get_param(req, 'limit')
         if given_limit and given_limit.isdigit():
             limit = int(given_limit)
-            if limit > constraints.CONTAINER_LISTING_LIMIT:
+            if limit > max_limit:
                 return HTTPPreconditionFailed(
                     request=req,
-                    body='Maximum limit is %d'
-                         % constraints.CONTAINER_LISTING_LIMIT)
+                    body='Maximum limit is %d' % max_limit)
 
         out_content_type = get_listing_content_type(req)
         if path is not None:
@@ -134,15 +222,46 @@ class ContainerController(SwiftContainerController):
                 prefix = path.rstrip('/') + '/'
             delimiter = '/'
         opts = req.environ.get('oio_query', {})
-        try:
-            result = storage.object_list(
+        versions = opts.get('versions', False)
+        deleted = opts.get('deleted', False)
+        max_versions = opts.get('max_versions') if versions else None
+        if max_versions == 1:
+            # The backend lists the latest version of each object
+            # (delete markers included) when not asked for all versions
+            versions = False
+            deleted = True
+            max_versions = None
+        last_object = {'name': None, 'count': 0}
+
+        def list_page(page_marker, page_limit):
+            page = storage.object_list(
                 self.account_name, self.container_name, prefix=prefix,
-                limit=limit, delimiter=delimiter, marker=marker,
+                limit=page_limit, delimiter=delimiter, marker=page_marker,
                 end_marker=end_marker, properties=True,
-                versions=opts.get('versions', False),
-                deleted=opts.get('deleted', False))
+                versions=versions, deleted=deleted)
+            if 'truncated' not in page:
+                # compatibility with oio-sds not telling if the listing
+                # has been truncated
+                page['truncated'] = len(page['objects']) + len(
+                    page.get('prefixes', [])) >= page_limit
+            if max_versions:
+                if page['truncated']:
+                    # Do not resume from an object filtered out,
+                    # nor from the middle of the versions of an object
+                    page['objects'], page['next_marker'] = \
+                        _hold_last_versions(page, max_versions, delimiter)
+                page['objects'] = _keep_latest_versions(
+                    page['objects'], max_versions, last_object)
+            return page
+
+        try:
+            result = list_page(
+                marker, min(limit, constraints.CONTAINER_LISTING_LIMIT))
 
             resp_headers = self.get_metadata_resp_headers(result)
+            if self.app.container_listing_max_limit > 0:
+                result = self.paginate_listing(
+                    result, list_page, limit, delimiter)
             resp = self.create_listing(
                 req, out_content_type, resp_headers, result,
                 self.container_name, **opts)
@@ -150,6 +269,33 @@ class ContainerController(SwiftContainerController):
             return HTTPNotFound(request=req)
         return resp
 
+    def paginate_listing(self, result, list_page, limit, delimiter=None):
+        """
+        Chain the backend listing pages following `result`, until `limit`
+        records have been listed or the backend has nothing more to list.
+        The next page is requested while the current one is serialized.
+        """
+        if not result['truncated']:
+            return result
+        listed = [0]
+
+        def next_page(page):
+            listed[0] += len(page['objects']) + len(page.get('prefixes', []))
+            if not page['truncated'] or listed[0] >= limit:
+                return None
+            return list_page(
+                _next_marker(page, delimiter),
+                min(limit - listed[0], constraints.CONTAINER_LISTING_LIMIT))
+
+        def records():
+            for page in iter_pages(result, next_page):
+                for record in page['objects']:
+                    yield record
+                for prefix in page.get('prefixes', []):
+                    yield {'name': prefix, 'subdir': True}
+
+        return {'objects': records()}
+
     def create_listing(self, req, out_content_type, resp_headers,
                        result, container, **kwargs):
         container_list = result['objects']
@@ -160,13 +306,23 @@ class ContainerController(SwiftContainerController):
         ret = Response(request=req, headers=resp_headers,
                        content_type=out_content_type, charset='utf-8')
         versions = kwargs.get('versions', False)
-        if out_content_type == 'application/json':
+        versioned_names = kwargs.get('versioned_names', False)
+        if self.app.stream_listings:
+            if out_content_type == 'text/plain' and not container_list:
+                return HTTPNoContent(request=req, headers=resp_headers)
+            ret.app_iter = buffered_iter(
+                self.iter_listing(out_content_type, container_list,
+                                  container, versions, versioned_names),
+                self.app.client_chunk_size)
+        elif out_content_type == 'application/json':
             ret.body = json.dumps(
-                [self.update_data_record(r, versions) for r in container_list])
+                [self.update_data_record(r, versions, versioned_names)
+                 for r in container_list])
         elif out_content_type.endswith('/xml'):
             doc = Element('container', name=container.decode('utf-8'))
             for obj in container_list:
-                record = self.update_data_record(obj, versions)
+                record = self.update_data_record(
+                    obj, versions, versioned_names)
                 if 'subdir' in record:
                     name = record['subdir'].decode('utf-8')
                     sub = SubElement(doc, 'subdir', name=name)
@@ -186,15 +342,69 @@ class ContainerController(SwiftContainerController):
         else:
             if not container_list:
                 return HTTPNoContent(request=req, headers=resp_headers)
-            ret.body = '\n'.join(rec['name'] for rec in container_list) + '\n'
+            ret.body = '\n'.join(
+                _utf8(self.record_name(rec, versioned_names))
+                for rec in container_list) + '\n'
 
         return ret
 
-    def update_data_record(self, record, versions=False):
+    def iter_listing(self, out_content_type, container_list, container,
+                     versions=False, versioned_names=False):
+        """
+        Serialize the records of `container_list` one by one,
+        without building the whole listing in memory.
+        """
+        if out_content_type == 'application/json':
+            yield '['
+            separator = ''
+            for obj in container_list:
+                yield separator + json.dumps(
+                    self.update_data_record(obj, versions, versioned_names))
+                separator = ', '
+            yield ']'
+        elif out_content_type.endswith('/xml'):
+            yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+            records = iter(container_list)
+            first = next(records, None)
+            if first is None:
+                yield '<container name=%s />' % _xml_attr(container)
+                return
+            yield '<container name=%s>' % _xml_attr(container)
+            for obj in chain([first], records):
+                record = self.update_data_record(
+                    obj, versions, versioned_names)
+                if 'subdir' in record:
+                    yield '<subdir name=%s><name>%s</name></subdir>' % (
+                        _xml_attr(record['subdir']),
+                        _xml_text(record['subdir']))
+                    continue
+                fields = ["name", "hash", "bytes", "content_type",
+                          "last_modified"]
+                fields.extend(sorted(k for k in record if k not in fields))
+                yield '<object>%s</object>' % ''.join(
+                    _xml_element(field, record[field]) for field in fields)
+            yield '</container>'
+        else:
+            for obj in container_list:
+                yield _utf8(self.record_name(obj, versioned_names)) + '\n'
+
+    def record_name(self, record, versioned_names=False):
+        """
+        Get the name of the object of `record`, as listed. With
+        `versioned_names`, it is built by swift3_versioned_object_name(),
+        as in the versioning containers of the versioned_writes middleware.
+        """
+        if versioned_names and 'subdir' not in record:
+            return swift3_versioned_object_name(
+                record['name'], record.get('version', 'null'))
+        return record['name']
+
+    def update_data_record(self, record, versions=False,
+                           versioned_names=False):
         if 'subdir' in record:
             return {'subdir': record['name']}
 
-        response = {'name': record['name'],
+        response = {'name': self.record_name(record, versioned_names),
                     'bytes': record['size'],
                     'hash': record['hash'].lower(),
                     'last_modified': Timestamp(record['ctime']).isoformat,
@@ -227,16 +437,35 @@ class ContainerController(SwiftContainerController):
         headers = dict()
         out_content_type = get_listing_content_type(req)
         headers['Content-Type'] = out_content_type
-        storage = self.app.storage
+        meta = self.get_container_properties()
+        if meta is None:
+            return HTTPNotFound(request=req, headers=headers)
+        headers.update(self.get_metadata_resp_headers(meta))
+        resp = HTTPNoContent(request=req, headers=headers, charset='utf-8')
+        return resp
+
+    def get_container_properties(self):
+        """
+        Get the properties of the container, from the in-process container
+        cache if possible (missing containers are cached too).
+
+        :returns: the properties, or None if the container does not exist
+        """
+        entry = get_container_cache_entry(
+            self.app, self.account_name, self.container_name)
+        if entry is not None:
+            if 'properties' in entry:
+                self.app.logger.increment('container_cache.hit')
+                return entry['properties']
+            self.app.logger.increment('container_cache.miss')
         try:
-            meta = storage.container_get_properties(self.account_name,
-                                                    self.container_name)
-            headers.update(self.get_metadata_resp_headers(meta))
-            resp = HTTPNoContent(request=req, headers=headers, charset='utf-8')
+            meta = self.app.storage.container_get_properties(
+                self.account_name, self.container_name)
         except exceptions.NoSuchContainer:
-            resp = HTTPNotFound(request=req, headers=headers)
-
-        return resp
+            meta = None
+        if entry is not None:
+            entry['properties'] = meta
+        return meta
 
     def properties_from_headers(self, headers):
         metadata = {
@@ -319,16 +548,24 @@ class ContainerController(SwiftContainerController):
                 return resp
 
         headers = self.generate_request_headers(req, transfer=True)
-        clear_info_cache(self.app, req.environ, self.account_name,
-                         self.container_name)
+        clear_container_cache(self.app, req.environ, self.account_name,
+                              self.container_name)
         resp = self.get_container_create_resp(req, headers)
         return resp
 
     @public
+    @delay_denial
     @cors_validation
     @handle_service_busy
     def POST(self, req):
         """HTTP POST request handler."""
+        if 'bulk-head' in req.params:
+            return self.get_bulk_head_resp(req)
+        if 'swift.authorize' in req.environ:
+            # The denial has only been delayed for bulk-head requests
+            aresp = req.environ['swift.authorize'](req)
+            if aresp:
+                return aresp
         error_response = \
             self.clean_acls(req) or check_metadata(req, 'container')
         if error_response:
@@ -342,12 +579,74 @@ class ContainerController(SwiftContainerController):
             return HTTPNotFound(request=req)
 
         headers = self.generate_request_headers(req, transfer=True)
-        clear_info_cache(self.app, req.environ,
-                         self.account_name, self.container_name)
+        clear_container_cache(self.app, req.environ,
+                              self.account_name, self.container_name)
 
         resp = self.get_container_post_resp(req, headers)
         return resp
 
+    def get_bulk_head_resp(self, req):
+        """
+        Get the metadata of the objects whose names are given as a JSON
+        list in the request body, as one JSON document.
+        """
+        container_info = self.container_info(
+            self.account_name, self.container_name, req)
+        req.acl = container_info['read_acl']
+        if 'swift.authorize' in req.environ:
+            aresp = req.environ['swift.authorize'](req)
+            if aresp:
+                return aresp
+        if not is_success(container_info.get('status')):
+            return HTTPNotFound(request=req)
+
+        max_names = constraints.CONTAINER_LISTING_LIMIT
+        max_body = max_names * (constraints.MAX_OBJECT_NAME_LENGTH + 4)
+        body = req.body_file.read(max_body + 1)
+        if len(body) > max_body:
+            return HTTPRequestEntityTooLarge(request=req)
+        try:
+            names = json.loads(body)
+        except ValueError:
+            names = None
+        if not isinstance(names, list) or \
+                not all(isinstance(name, basestring) for name in names):
+            return HTTPBadRequest(request=req, content_type='text/plain',
+                                  body='Expected a JSON list of object names')
+        if len(names) > max_names:
+            return HTTPRequestEntityTooLarge(
+                request=req, content_type='text/plain',
+                body='Maximum number of objects is %d' % max_names)
+
+        result = {'objects': [], 'not_found': [], 'errors': []}
+        pool = GreenPool(self.app.bulk_concurrency)
+        for name, meta, error in pool.imap(
+                self.app.storage.bind(self._bulk_object_show), names):
+            if meta is not None:
+                result['objects'].append(meta)
+            elif error is None:
+                result['not_found'].append(name)
+            else:
+                result['errors'].append([name, error])
+        return HTTPOk(request=req, body=json.dumps(result),
+                      content_type='application/json', charset='utf-8')
+
+    def _bulk_object_show(self, name):
+        try:
+            meta = self.app.storage.object_show(
+                self.account_name, self.container_name, name)
+        except (exceptions.NoSuchObject, exceptions.NoSuchContainer):
+            return name, None, None
+        except Exception as err:
+            self.app.logger.exception('ERROR bulk-head of %s', name)
+            return name, None, str(err)
+        record = self.update_data_record(
+            dict(meta, name=name, size=meta['length']), versions=True)
+        record['meta'] = {
+            k: v for k, v in (meta.get('properties') or {}).iteritems()
+            if is_user_meta('object', k)}
+        return name, record, None
+
     def get_container_post_resp(self, req, headers):
         storage = self.app.storage
 
@@ -385,8 +684,8 @@ class ContainerController(SwiftContainerController):
         if not accounts:
             return HTTPNotFound(request=req)
         headers = self.generate_request_headers(req, transfer=True)
-        clear_info_cache(self.app, req.environ,
-                         self.account_name, self.container_name)
+        clear_container_cache(self.app, req.environ,
+                              self.account_name, self.container_name)
         resp = self.get_container_delete_resp(req, headers)
         if resp.status_int == HTTP_ACCEPTED:
             return HTTPNotFound(request=req)
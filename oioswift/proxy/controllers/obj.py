@@ -14,19 +14,33 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import mimetypes
 import time
 import math
+from bisect import bisect_right
+from collections import Counter, deque
+from copy import deepcopy
+from functools import partial
+from hashlib import md5
+from itertools import chain
+
+import eventlet
 
 from swift import gettext_ as _
 from swift.common.utils import (
-    clean_content_type, config_true_value, Timestamp, public)
+    clean_content_type, close_if_possible, config_true_value, Timestamp,
+    public)
 from swift.common.constraints import check_metadata, check_object_creation
+from swift.common.exceptions import SegmentError
+from swift.common.http import HTTP_NOT_FOUND, is_success
+from swift.common.middleware.slo import SYSMETA_SLO_ETAG, SYSMETA_SLO_SIZE
 from swift.common.middleware.versioned_writes import DELETE_MARKER_CONTENT_TYPE
 from swift.common.swob import HTTPAccepted, HTTPBadRequest, HTTPNotFound, \
     HTTPPreconditionFailed, HTTPRequestTimeout, \
     HTTPUnprocessableEntity, HTTPClientDisconnect, HTTPCreated, \
-    HTTPNoContent, Response, HTTPInternalServerError, multi_range_iterator
+    HTTPNoContent, Response, HTTPInternalServerError, HTTPConflict, \
+    multi_range_iterator
 from swift.common.request_helpers import is_sys_or_user_meta
 from swift.proxy.controllers.base import set_object_info_cache, \
         delay_denial, cors_validation
@@ -39,7 +53,90 @@ from oio.common import exceptions
 from oio.common.http import ranges_from_http_header
 from oio.common.green import SourceReadTimeout
 
-from oioswift.utils import handle_service_busy, ServiceBusy
+from oioswift.common.timing import TIMING_ENV_KEY, TimedStream
+from oioswift.utils import get_container_cache_entry, \
+    handle_service_busy, IterO, read_chunks, ReadAheadIterator, ServiceBusy
+
+
+def _is_not_modified(req, resp):
+    """
+    Tell if the (conditional) response to `req` will be a 304,
+    following the same rules as swob.
+    """
+    etag = resp.conditional_etag
+    if etag and req.if_none_match and etag in req.if_none_match:
+        return True
+    return bool(resp.last_modified and req.if_modified_since and
+                resp.last_modified <= req.if_modified_since)
+
+
+# Set on the responses to the GET requests of the copy middleware, to let
+# the PUT of the copy (which receives the object metadata as headers)
+# reference the chunks of the source object instead of copying its data.
+COPY_SOURCE_HEADER = 'X-Object-Sysmeta-Oio-Copy-Source'
+
+
+class HeaderFilter(object):
+    """
+    Tell which headers are object metadata (system or user metadata, or
+    one of `allowed_headers`), remembering the answer for each raw header
+    name, since the same few names are met over and over again.
+    """
+
+    def __init__(self, allowed_headers, max_size=4096):
+        self.allowed_headers = allowed_headers
+        self.max_size = max_size
+        self._known = dict()
+
+    def __call__(self, key):
+        """
+        :returns: the lowercase name of the header if it is object
+            metadata, None otherwise
+        """
+        try:
+            return self._known[key]
+        except KeyError:
+            pass
+        name = key.lower()
+        if not (is_sys_or_user_meta('object', name) or
+                name in self.allowed_headers):
+            name = None
+        if len(self._known) >= self.max_size:
+            self._known.clear()
+        self._known[key] = name
+        return name
+
+
+class CreateOnlySource(object):
+    """
+    Wrap the data source of an upload with `If-None-Match: *`, to check
+    again that the object does not exist (with `object_exists()`) once
+    all the data has been read, right before oio-sds commits the object.
+    A PreconditionFailed error is raised to abort the upload if it does.
+    """
+
+    def __init__(self, source, size, object_exists):
+        self.source = source
+        self.size = size
+        self.object_exists = object_exists
+        self.bytes_read = 0
+        self.checked = False
+
+    def read(self, size=-1):
+        data = self.source.read(size)
+        self.bytes_read += len(data)
+        if not self.checked and (not data or (
+                self.size is not None and self.bytes_read >= self.size)):
+            self.checked = True
+            if self.object_exists():
+                raise exceptions.PreconditionFailed(
+                    'Object created during the upload')
+        return data
+
+
+# Size (in client chunks) of the largest span of ranges fetched and kept
+# in memory when serving multi-range requests in parallel
+MAX_RANGE_SPAN_CHUNKS = 8
 
 
 class ObjectControllerRouter(object):
@@ -47,9 +144,39 @@ class ObjectControllerRouter(object):
         return ObjectController
 
 
+def _coalesce_ranges(ranges):
+    """
+    Merge overlapping or adjacent (start, stop) ranges.
+
+    :returns: the sorted list of the resulting (start, stop) spans
+    """
+    spans = []
+    for start, stop in sorted(ranges):
+        if spans and start <= spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(stop, spans[-1][1]))
+        else:
+            spans.append((start, stop))
+    return spans
+
+
 class StreamRangeIterator(object):
-    def __init__(self, stream):
+    """
+    Serve the ranges of an object from the oio stream.
+
+    When `fetch_range` is set and several ranges are requested, they are
+    coalesced into spans fetched by up to `concurrency` green threads,
+    with `fetch_range(start, end)` (end being inclusive). Since each span
+    is kept in memory until its ranges have been sent, this is only done
+    when no span is larger than `max_span_size` bytes (if set), the
+    ranges being read from the stream otherwise.
+    """
+
+    def __init__(self, stream, fetch_range=None, concurrency=1,
+                 max_span_size=None):
         self.stream = stream
+        self.fetch_range = fetch_range
+        self.concurrency = concurrency
+        self.max_span_size = max_span_size
 
     def app_iter_range(self, _start, _stop):
         # This will be called when there is only one range,
@@ -64,23 +191,171 @@ class StreamRangeIterator(object):
             yield dat
             raise StopIteration
 
+    def _iter_spans(self, spans):
+        """Fetch `spans` concurrently, yield their data in order."""
+        todo = deque(spans)
+        pending = deque()
+        try:
+            while todo or pending:
+                while todo and len(pending) < self.concurrency:
+                    start, stop = todo.popleft()
+                    pending.append(
+                        eventlet.spawn(self.fetch_range, start, stop - 1))
+                yield pending.popleft().wait()
+        finally:
+            for thread in pending:
+                thread.kill()
+
+    def _parallel_app_iter_ranges(self, ranges, spans, content_type,
+                                  boundary, content_size):
+        # The ranges will be fetched separately
+        if hasattr(self.stream, 'close'):
+            self.stream.close()
+        starts = [start for start, _stop in spans]
+        span_of_range = [bisect_right(starts, start) - 1
+                         for start, _stop in ranges]
+        # Number of ranges still to be served by each span
+        users = Counter(span_of_range)
+        order = iter(span_of_range)
+        fetched = self._iter_spans(spans)
+        received = []
+
+        def _span_app_iter_range(start, stop):
+            idx = next(order)
+            while idx >= len(received):
+                received.append(next(fetched))
+            offset = spans[idx][0]
+            data = received[idx][start - offset:stop - offset]
+            users[idx] -= 1
+            if not users[idx]:
+                received[idx] = None
+            yield data
+
+        try:
+            for chunk in multi_range_iterator(
+                    ranges, content_type, boundary, content_size,
+                    _span_app_iter_range):
+                yield chunk
+        finally:
+            fetched.close()
+
     def app_iter_ranges(self, ranges, content_type,
                         boundary, content_size,
                         *_args, **_kwargs):
-        for chunk in multi_range_iterator(
+        spans = None
+        if self.fetch_range and self.concurrency > 1 and len(ranges) > 1:
+            spans = _coalesce_ranges(ranges)
+            if self.max_span_size and any(
+                    stop - start > self.max_span_size
+                    for start, stop in spans):
+                spans = None
+        if spans:
+            iter_ranges = self._parallel_app_iter_ranges(
+                ranges, spans, content_type, boundary, content_size)
+        else:
+            iter_ranges = multi_range_iterator(
                 ranges, content_type, boundary, content_size,
-                self._chunked_app_iter_range):
+                self._chunked_app_iter_range)
+        for chunk in iter_ranges:
             yield chunk
 
     def __iter__(self):
         return self.stream
 
 
+class CachedRangeIterator(object):
+    """
+    Serve the ranges of an object from the blocks of a RangeCache,
+    fetching the missing blocks with `fetch_range(start, end)`.
+    """
+
+    def __init__(self, cache, key, length, fetch_range, logger):
+        self.cache = cache
+        self.key = key
+        self.length = length
+        self.fetch_range = fetch_range
+        self.logger = logger
+
+    def _get_block(self, index):
+        data = self.cache.get(self.key, index)
+        if data is not None:
+            self.logger.increment('range_cache.hit')
+            return data
+        self.logger.increment('range_cache.miss')
+        start = index * self.cache.block_size
+        end = min(start + self.cache.block_size, self.length) - 1
+        data = self.fetch_range(start, end)
+        self.cache.put(self.key, index, data)
+        return data
+
+    def app_iter_range(self, start, stop):
+        block_size = self.cache.block_size
+        for index in xrange(start // block_size,
+                            (stop - 1) // block_size + 1):
+            offset = index * block_size
+            data = self._get_block(index)
+            yield data[max(start - offset, 0):stop - offset]
+
+    def app_iter_ranges(self, ranges, content_type,
+                        boundary, content_size,
+                        *_args, **_kwargs):
+        return multi_range_iterator(ranges, content_type, boundary,
+                                    content_size, self.app_iter_range)
+
+    def __iter__(self):
+        return self.app_iter_range(0, self.length)
+
+
+def iter_segments(first, segments, open_segment, prefetch):
+    """
+    Yield the data of the `first` opened segment, then of `segments`,
+    each one being opened with `open_segment(segment)` in a green thread
+    (which returns an iterator over its data), up to `prefetch` segments
+    ahead of the one being consumed.
+    """
+    todo = deque(segments)
+    pending = deque()
+    current = first
+    try:
+        while current is not None:
+            while todo and len(pending) < prefetch:
+                pending.append(eventlet.spawn(open_segment, todo.popleft()))
+            for data in current:
+                yield data
+            current.close()
+            current = pending.popleft().wait() if pending else None
+    finally:
+        if current is not None:
+            current.close()
+        for thread in pending:
+            if not thread.dead:
+                thread.kill()
+                continue
+            try:
+                thread.wait().close()
+            except Exception:
+                pass
+
+
 class ObjectController(BaseObjectController):
     allowed_headers = {'content-disposition', 'content-encoding',
                        'x-delete-at', 'x-object-manifest',
                        'x-static-large-object'}
 
+    @property
+    def metadata_filter(self):
+        """
+        HeaderFilter of the current allowed_headers, shared by the
+        instances of the class.
+        """
+        cls = type(self)
+        header_filter = cls.__dict__.get('_metadata_filter')
+        if header_filter is None or \
+                header_filter.allowed_headers != self.allowed_headers:
+            header_filter = HeaderFilter(frozenset(self.allowed_headers))
+            cls._metadata_filter = header_filter
+        return header_filter
+
     @public
     @cors_validation
     @delay_denial
@@ -122,20 +397,87 @@ class ObjectController(BaseObjectController):
 
         return resp
 
+    def container_info(self, account, container, req=None):
+        entry = get_container_cache_entry(self.app, account, container)
+        if entry is None:
+            return super(ObjectController, self).container_info(
+                account, container, req)
+        info = entry.get('info')
+        if info is not None:
+            self.app.logger.increment('container_cache.hit')
+        else:
+            self.app.logger.increment('container_cache.miss')
+            info = super(ObjectController, self).container_info(
+                account, container, req)
+            # Do not keep serving a transient error
+            if is_success(info['status']) or \
+                    info['status'] == HTTP_NOT_FOUND:
+                entry['info'] = info
+        # The callers may modify the nested dicts (meta, sysmeta...)
+        return deepcopy(info)
+
+    def _get_cached_metadata(self, version):
+        cache = self.app.object_metadata_cache
+        if cache is None:
+            return None
+        versions = cache.get(
+            (self.account_name, self.container_name, self.object_name))
+        metadata = versions.get(version) if versions else None
+        if metadata is None:
+            self.app.logger.increment('object_metadata_cache.miss')
+        else:
+            self.app.logger.increment('object_metadata_cache.hit')
+        return metadata
+
+    def _cache_metadata(self, version, metadata):
+        cache = self.app.object_metadata_cache
+        if cache is None:
+            return
+        key = (self.account_name, self.container_name, self.object_name)
+        versions = cache.get(key)
+        if versions is None:
+            versions = dict()
+            evicted = cache.set(key, versions)
+            if evicted:
+                self.app.logger.update_stats(
+                    'object_metadata_cache.eviction', evicted)
+        versions[version] = metadata
+
+    def _uncache_metadata(self):
+        cache = self.app.object_metadata_cache
+        if cache is not None:
+            cache.pop(
+                (self.account_name, self.container_name, self.object_name))
+
     def get_object_head_resp(self, req):
         storage = self.app.storage
-        try:
-            metadata = storage.object_show(
-                self.account_name, self.container_name, self.object_name,
-                version=req.environ.get('oio_query', {}).get('version'))
-        except (exceptions.NoSuchObject, exceptions.NoSuchContainer):
-            return HTTPNotFound(request=req)
+        version = req.environ.get('oio_query', {}).get('version')
+        metadata = self._get_cached_metadata(version)
+        if metadata is None:
+            try:
+                metadata = storage.object_show(
+                    self.account_name, self.container_name,
+                    self.object_name, version=version)
+            except (exceptions.NoSuchObject, exceptions.NoSuchContainer):
+                return HTTPNotFound(request=req)
+            self._cache_metadata(version, metadata)
 
         resp = self.make_object_response(req, metadata)
         return resp
 
     def get_object_fetch_resp(self, req):
         storage = self.app.storage
+        version = req.environ.get('oio_query', {}).get('version')
+        if req.if_none_match is not None or req.if_modified_since:
+            metadata = self._get_cached_metadata(version)
+            if metadata is not None:
+                resp = self.make_object_response(req, metadata)
+                if _is_not_modified(req, resp):
+                    return resp
+        if req.range and self.app.range_cache is not None:
+            resp = self.get_object_cached_range_resp(req, version)
+            if resp is not None:
+                return resp
         if req.headers.get('Range'):
             ranges = ranges_from_http_header(req.headers.get('Range'))
         else:
@@ -143,13 +485,160 @@ class ObjectController(BaseObjectController):
         try:
             metadata, stream = storage.object_fetch(
                 self.account_name, self.container_name, self.object_name,
-                ranges=ranges,
-                version=req.environ.get('oio_query', {}).get('version'))
+                ranges=ranges, version=version)
         except (exceptions.NoSuchObject, exceptions.NoSuchContainer):
             return HTTPNotFound(request=req)
+        self._cache_metadata(version, metadata)
+        if not ranges and self._is_native_slo_get(req, metadata):
+            return self.get_slo_resp(req, metadata, stream)
         resp = self.make_object_response(req, metadata, stream, ranges=ranges)
+        if req.environ.get('swift.source') == 'SSC' and not ranges:
+            self._set_copy_source(resp, metadata)
+        return resp
+
+    def _is_native_slo_get(self, req, metadata):
+        """
+        Tell if the segments of the requested static large object can be
+        assembled here instead of by the slo middleware. Only the account
+        owner is served this way, since the segment containers are not
+        authorized separately.
+        """
+        properties = metadata.get('properties') or {}
+        return (self.app.slo_prefetch_segments > 0 and
+                config_true_value(properties.get('x-static-large-object')) and
+                req.environ.get('swift.source') != 'SLO' and
+                'multipart-manifest' not in req.params and
+                bool(req.environ.get('swift_owner')))
+
+    def get_slo_resp(self, req, metadata, stream):
+        """
+        Serve the data of a static large object, fetching its segments
+        while the previous ones are sent to the client. Manifests of
+        nested manifests or of segment ranges are returned as is, for
+        the slo middleware to handle them.
+        """
+        manifest = ''.join(stream)
+        resp = self.make_object_response(req, metadata)
+        try:
+            segments = json.loads(manifest)
+        except ValueError:
+            segments = None
+        if not segments or any(seg.get('sub_slo') or seg.get('range')
+                               for seg in segments):
+            resp.app_iter = [manifest]
+            resp.content_length = len(manifest)
+            return resp
+
+        properties = metadata.get('properties') or {}
+        etag = properties.get(SYSMETA_SLO_ETAG.lower())
+        if not etag:
+            etag = md5(''.join(seg['hash'] for seg in segments)).hexdigest()
+        size = properties.get(SYSMETA_SLO_SIZE.lower())
+        if size is None:
+            size = sum(int(seg['bytes']) for seg in segments)
+        # Without this header, the slo middleware lets the response through
+        del resp.headers['X-Static-Large-Object']
+        resp.headers['etag'] = '"%s"' % etag
+        resp.content_length = int(size)
+        if _is_not_modified(req, resp):
+            return resp
+
+        try:
+            first = self._open_slo_segment(segments[0])
+        except (SegmentError, exceptions.NoSuchObject,
+                exceptions.NoSuchContainer) as exc:
+            return HTTPConflict(request=req, body=str(exc))
+        resp.app_iter = self._iter_slo_segments(
+            first, segments[1:], req.path)
+        # Setting app_iter resets the length
+        resp.content_length = int(size)
+        return resp
+
+    def _open_slo_segment(self, segment):
+        """
+        Fetch a segment of a static large object, checking that it still
+        matches the manifest.
+
+        :returns: an iterator over the data of the segment
+        """
+        name = segment['name'].encode('utf-8')
+        container, obj = name.lstrip('/').split('/', 1)
+        metadata, stream = self.app.storage.object_fetch(
+            self.account_name, container, obj)
+        if metadata['hash'].lower() != segment['hash'].lower() or \
+                int(metadata['length']) != int(segment['bytes']):
+            if hasattr(stream, 'close'):
+                stream.close()
+            raise SegmentError(
+                'Object segment no longer valid: %s' % name)
+        return ReadAheadIterator(stream, self.app.download_read_ahead,
+                                 buffer_size=self.app.client_chunk_size)
+
+    def _iter_slo_segments(self, first, segments, path):
+        try:
+            for data in iter_segments(first, segments,
+                                      self._open_slo_segment,
+                                      self.app.slo_prefetch_segments):
+                yield data
+        except (SegmentError, exceptions.NoSuchObject,
+                exceptions.NoSuchContainer) as exc:
+            self.app.logger.error(
+                'While processing manifest %s, got %s', path, exc)
+            raise
+
+    def _set_copy_source(self, resp, metadata):
+        """
+        Tell the PUT of a server-side copy where the data comes from,
+        unless the object is a manifest, whose data is rewritten.
+        """
+        if config_true_value(metadata['deleted']) or \
+                'X-Static-Large-Object' in resp.headers or \
+                'X-Object-Manifest' in resp.headers:
+            return
+        resp.headers[COPY_SOURCE_HEADER] = json.dumps({
+            'account': self.account_name,
+            'container': self.container_name,
+            'object': self.object_name,
+            'version': metadata['version'],
+            'hash': metadata['hash'].lower(),
+            'mime_type': resp.headers['Content-Type']})
+
+    def get_object_cached_range_resp(self, req, version):
+        """
+        Serve the requested ranges through the range cache.
+
+        :returns: None if the request cannot be served from the cache
+        """
+        metadata = self._get_cached_metadata(version)
+        if metadata is None:
+            try:
+                metadata = self.app.storage.object_show(
+                    self.account_name, self.container_name,
+                    self.object_name, version=version)
+            except (exceptions.NoSuchObject, exceptions.NoSuchContainer):
+                return HTTPNotFound(request=req)
+            self._cache_metadata(version, metadata)
+        length = int(metadata['length'])
+        if config_true_value(metadata['deleted']) or \
+                req.range.ranges_for_length(length) is None:
+            return None
+        resp = self.make_object_response(req, metadata)
+        resp.app_iter = CachedRangeIterator(
+            self.app.range_cache,
+            (self.account_name, self.container_name, self.object_name,
+             metadata['version']),
+            length, partial(self._fetch_range, metadata['version']),
+            self.app.logger)
+        # Setting app_iter resets the length
+        resp.content_length = length
         return resp
 
+    def _fetch_range(self, version, start, end):
+        _metadata, stream = self.app.storage.object_fetch(
+            self.account_name, self.container_name, self.object_name,
+            ranges=[(start, end)], version=version)
+        return ''.join(stream)
+
     def make_object_response(self, req, metadata, stream=None, ranges=None):
         conditional_etag = None
         if 'X-Backend-Etag-Is-At' in req.headers:
@@ -166,17 +655,30 @@ class ObjectController(BaseObjectController):
                 'mime_type', 'application/octet-stream')
         properties = metadata.get('properties')
         if properties:
+            metadata_filter = self.metadata_filter
             for k, v in properties.iteritems():
-                if is_sys_or_user_meta('object', k) or \
-                        k.lower() in self.allowed_headers:
+                if metadata_filter(k):
                     resp.headers[str(k)] = v
         resp.headers['etag'] = metadata['hash'].lower()
         resp.headers['x-object-sysmeta-version-id'] = metadata['version']
         ts = Timestamp(metadata['ctime'])
         resp.last_modified = math.ceil(float(ts))
         if stream:
+            timing = req.environ.get(TIMING_ENV_KEY)
+            if timing is not None:
+                stream = TimedStream(stream, timing, self.app.logger)
             if ranges:
-                resp.app_iter = StreamRangeIterator(stream)
+                resp.app_iter = StreamRangeIterator(
+                    stream,
+                    fetch_range=partial(self._fetch_range,
+                                        metadata['version']),
+                    concurrency=self.app.range_fetch_concurrency,
+                    max_span_size=(self.app.client_chunk_size *
+                                   MAX_RANGE_SPAN_CHUNKS))
+            elif self.app.download_read_ahead > 0:
+                resp.app_iter = ReadAheadIterator(
+                    stream, self.app.download_read_ahead,
+                    buffer_size=self.app.client_chunk_size)
             else:
                 resp.app_iter = stream
 
@@ -190,13 +692,11 @@ class ObjectController(BaseObjectController):
 
     def load_object_metadata(self, headers):
         metadata = {}
-        metadata.update(
-            (k.lower(), v) for k, v in headers.iteritems()
-            if is_sys_or_user_meta('object', k))
-        for header_key in self.allowed_headers:
-            if header_key in headers:
-                headers_lower = header_key.lower()
-                metadata[headers_lower] = headers[header_key]
+        metadata_filter = self.metadata_filter
+        for k, v in headers.iteritems():
+            name = metadata_filter(k)
+            if name:
+                metadata[name] = v
         return metadata
 
     @public
@@ -238,6 +738,8 @@ class ObjectController(BaseObjectController):
                 metadata, clear=True)
         except (exceptions.NoSuchObject, exceptions.NoSuchContainer):
             return HTTPNotFound(request=req)
+        finally:
+            self._uncache_metadata()
         resp = HTTPAccepted(request=req)
         return resp
 
@@ -273,12 +775,102 @@ class ObjectController(BaseObjectController):
 
         self._update_x_timestamp(req)
 
-        data_source = req.environ['wsgi.input']
+        if req.if_none_match is not None and self._object_exists():
+            # Do not even read the data of the client
+            return HTTPPreconditionFailed(request=req)
+
+        read_ahead = self.app.upload_read_ahead
+        copy_source = req.headers.pop(COPY_SOURCE_HEADER, None)
+        if req.environ.get('swift.source') == 'SSC':
+            if copy_source:
+                resp = self._link_object(req, json.loads(copy_source))
+                if resp is not None:
+                    self._close_copy_source(req)
+                    return resp
+            # Download the source while uploading the copy
+            read_ahead = max(read_ahead, 2)
+
+        data_source = read_ahead_source = req.environ['wsgi.input']
+        if read_ahead > 0:
+            # Read from the client while the previous data is being
+            # uploaded to the rawx services.
+            data_source = read_ahead_source = IterO(ReadAheadIterator(
+                read_chunks(data_source, self.app.client_chunk_size),
+                read_ahead))
+        if req.if_none_match is not None:
+            # oio-sds cannot create an object only if it does not exist:
+            # shorten the race with another upload as much as possible.
+            data_source = CreateOnlySource(
+                data_source, req.content_length, self._object_exists)
 
         headers = self._prepare_headers(req)
-        resp = self._store_object(req, data_source, headers)
+        try:
+            resp = self._store_object(req, data_source, headers)
+        finally:
+            if read_ahead_source is not req.environ['wsgi.input']:
+                read_ahead_source.close()
         return resp
 
+    def _link_object(self, req, source):
+        """
+        Make the object reference the chunks of the object `source`
+        (described by the copy source header), if oio-sds can do it.
+
+        :returns: a response, or None if the data must be copied
+        """
+        storage = self.app.storage
+        if not hasattr(storage, 'object_link'):
+            return None
+        if req.headers.get('Content-Type') != source['mime_type'] or \
+                (source['account'], source['container'], source['object']) \
+                == (self.account_name, self.container_name, self.object_name):
+            # The link cannot change the content type, nor replace its target
+            return None
+        headers = self._prepare_headers(req)
+        metadata = self.load_object_metadata(headers)
+        try:
+            storage.object_link(
+                source['account'], source['container'], source['object'],
+                self.account_name, self.container_name, self.object_name,
+                target_version=source['version'],
+                properties_directive='REPLACE', metadata=metadata)
+        except (exceptions.NoSuchObject, exceptions.NoSuchContainer):
+            return HTTPNotFound(request=req)
+        except ServiceBusy:
+            raise
+        except Exception as err:
+            self.app.logger.warning(
+                _('Failed to link %(path)s to its copy source, '
+                  'copying the data: %(err)s'),
+                {'path': req.path, 'err': err})
+            return None
+        finally:
+            self._uncache_metadata()
+        return HTTPCreated(request=req, etag=source['hash'])
+
+    def _close_copy_source(self, req):
+        """
+        Stop the download of the copy source, its data being unused,
+        instead of waiting for the copy middleware to close it.
+        """
+        data_source = req.environ['wsgi.input']
+        # The copy middleware wraps the app_iter of the source
+        # in a FileLikeIter, whose close() does not close it.
+        close_if_possible(getattr(data_source, 'iterator', None))
+        close_if_possible(data_source)
+
+    def _object_exists(self):
+        """
+        Tell if the object exists (its latest version not being
+        a delete marker), asking the backend (not the metadata cache).
+        """
+        try:
+            metadata = self.app.storage.object_show(
+                self.account_name, self.container_name, self.object_name)
+        except (exceptions.NoSuchObject, exceptions.NoSuchContainer):
+            return False
+        return not config_true_value(metadata.get('deleted'))
+
     def _prepare_headers(self, req):
         req.headers['X-Timestamp'] = Timestamp(time.time()).internal
         headers = self.generate_request_headers(req, additional=req.headers)
@@ -286,17 +878,42 @@ class ObjectController(BaseObjectController):
 
     def _get_auto_policy_from_size(self, content_length):
         # the default stgpol has an offset of 0 so should always be choose
-        policy = None
-        for (name, offset) in self.app.oio_stgpol:
-            if offset <= content_length:
-                policy = name
+        index = bisect_right(self.app.oio_stgpol_offsets, content_length) - 1
+        if index < 0:
+            return None
+        return self.app.oio_stgpol[index][0]
+
+    def _get_auto_policy_from_data(self, data_source):
+        """
+        Read the beginning of an upload of unknown size, up to the
+        highest size threshold, to choose its auto storage policy.
 
-        return policy
+        :returns: a tuple with the policy and a file-like object to read
+            the whole data from
+        """
+        limit = self.app.auto_storage_policy_buffer_size
+        buf = []
+        size = 0
+        try:
+            while size < limit:
+                with SourceReadTimeout(self.app.client_timeout):
+                    data = data_source.read(
+                        min(limit - size, self.app.client_chunk_size))
+                if not data:
+                    break
+                buf.append(data)
+                size += len(data)
+        except (ValueError, IOError) as err:
+            raise exceptions.SourceReadError(str(err))
+        policy = self._get_auto_policy_from_size(size)
+        return policy, IterO(chain(
+            buf, read_chunks(data_source, self.app.client_chunk_size)))
 
     def _store_object(self, req, data_source, headers):
         content_type = req.headers.get('content-type', 'octet/stream')
         storage = self.app.storage
         policy = None
+        choose_policy_from_data = False
         container_info = self.container_info(self.account_name,
                                              self.container_name, req)
         if 'X-Oio-Storage-Policy' in req.headers:
@@ -314,13 +931,18 @@ class ObjectController(BaseObjectController):
                 policy_index = 0
             if policy_index != 0:
                 policy = self.app.POLICIES.get_by_index(policy_index).name
+            elif 'content-length' not in req.headers and \
+                    self.app.auto_storage_policy_buffer_size > 0:
+                choose_policy_from_data = True
             else:
                 content_length = int(req.headers.get('content-length', 0))
                 policy = self._get_auto_policy_from_size(content_length)
 
         metadata = self.load_object_metadata(headers)
-        # TODO actually support if-none-match
         try:
+            if choose_policy_from_data:
+                policy, data_source = self._get_auto_policy_from_data(
+                    data_source)
             chunks, size, checksum = storage.object_create(
                 self.account_name, self.container_name,
                 obj_name=self.object_name, file_or_path=data_source,
@@ -352,6 +974,8 @@ class ObjectController(BaseObjectController):
                 _('ERROR Exception transferring data %s'),
                 {'path': req.path})
             raise HTTPInternalServerError(request=req)
+        finally:
+            self._uncache_metadata()
 
         resp = HTTPCreated(request=req, etag=checksum)
         return resp
@@ -418,5 +1042,7 @@ class ObjectController(BaseObjectController):
         except exceptions.NoSuchObject:
             # Swift doesn't consider this case as an error
             pass
+        finally:
+            self._uncache_metadata()
         resp = HTTPNoContent(request=req)
         return resp
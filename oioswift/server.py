@@ -16,11 +16,15 @@
 from swift.common import storage_policy
 from oioswift.common.storage_policy import POLICIES
 from oioswift.common.ring import FakeRing
+from oioswift.common.range_cache import DEFAULT_BLOCK_SIZE, RangeCache
+from oioswift.common.timing import TIMING_HEADER, TimedStorage
 from oioswift.proxy.controllers.container import ContainerController
 from oioswift.proxy.controllers.account import AccountController
 from oioswift.proxy.controllers.obj import ObjectControllerRouter
 from oio import ObjectStorageApi
 from swift.proxy.server import Application as SwiftApplication
+from swift.common.utils import config_true_value
+from oioswift.utils import LRUCache
 import swift.common.utils
 import swift.proxy.server
 
@@ -55,6 +59,56 @@ class Application(SwiftApplication):
                     for k, v in conf.iteritems()
                     if k.startswith("sds_")}
 
+        self.stream_listings = config_true_value(
+            conf.get('stream_listings', False))
+        self.container_listing_max_limit = int(
+            conf.get('container_listing_max_limit', 0))
+        self.account_listing_max_limit = int(
+            conf.get('account_listing_max_limit', 0))
+
+        self.bulk_concurrency = int(conf.get('bulk_concurrency', 10))
+
+        self.download_read_ahead = int(conf.get('download_read_ahead', 0))
+        self.upload_read_ahead = int(conf.get('upload_read_ahead', 0))
+        self.range_fetch_concurrency = int(
+            conf.get('range_fetch_concurrency', 1))
+        self.slo_prefetch_segments = int(
+            conf.get('slo_prefetch_segments', 0))
+
+        self.object_metadata_cache = None
+        object_metadata_cache_size = int(
+            conf.get('object_metadata_cache_size', 0))
+        if object_metadata_cache_size > 0:
+            self.object_metadata_cache = LRUCache(
+                object_metadata_cache_size,
+                ttl=float(conf.get('object_metadata_cache_ttl', 5.0)))
+
+        self.account_info_cache = None
+        account_info_cache_size = int(
+            conf.get('account_info_cache_size', 0))
+        if account_info_cache_size > 0:
+            self.account_info_cache = LRUCache(
+                account_info_cache_size,
+                ttl=float(conf.get('account_info_cache_hard_ttl', 60.0)))
+        self.account_info_cache_soft_ttl = float(
+            conf.get('account_info_cache_soft_ttl', 5.0))
+
+        self.container_cache = None
+        container_cache_size = int(conf.get('container_cache_size', 0))
+        if container_cache_size > 0:
+            self.container_cache = LRUCache(
+                container_cache_size,
+                ttl=float(conf.get('container_cache_ttl', 1.0)))
+
+        self.range_cache = None
+        range_cache_path = conf.get('range_cache_path')
+        if range_cache_path:
+            self.range_cache = RangeCache(
+                range_cache_path,
+                int(conf.get('range_cache_size', 1024 * 1024 * 1024)),
+                block_size=int(conf.get('range_cache_block_size',
+                                        DEFAULT_BLOCK_SIZE)))
+
         self.oio_stgpol = []
         if 'auto_storage_policies' in conf:
             for elem in conf['auto_storage_policies'].split(','):
@@ -64,6 +118,12 @@ class Application(SwiftApplication):
                 else:
                     self.oio_stgpol.append((elem, 0))
             self.oio_stgpol.sort(key=lambda x: x[1])
+        # Size thresholds of the auto storage policies, for bisection
+        self.oio_stgpol_offsets = [pol[1] for pol in self.oio_stgpol]
+        # No need to buffer chunked uploads beyond the highest threshold
+        self.auto_storage_policy_buffer_size = min(
+            int(conf.get('auto_storage_policy_buffer_size', 0)),
+            self.oio_stgpol_offsets[-1] if self.oio_stgpol_offsets else 0)
 
         policies = []
         if 'oio_storage_policies' in conf:
@@ -80,8 +140,22 @@ class Application(SwiftApplication):
         sds_conf.pop('namespace')  # removed to avoid unpacking conflict
         # Loaded by ObjectStorageApi if None
         sds_proxy_url = sds_conf.pop('proxy_url', None)
-        self.storage = storage or \
+        storage = storage or \
             ObjectStorageApi(sds_namespace, endpoint=sds_proxy_url, **sds_conf)
+        self.storage = TimedStorage(storage, self.logger)
+        self.timing_header = config_true_value(
+            conf.get('oio_timing_header', False))
+
+    def handle_request(self, req):
+        previous = self.storage.start_request(req.environ)
+        try:
+            resp = SwiftApplication.handle_request(self, req)
+        finally:
+            self.storage.end_request(previous)
+        if self.timing_header and hasattr(resp, 'headers'):
+            resp.headers[TIMING_HEADER] = \
+                req.environ['oio.timing'].header_value()
+        return resp
 
 
 def app_factory(global_conf, **local_conf):
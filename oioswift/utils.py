@@ -13,7 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import sys
+import time
+from collections import OrderedDict, deque
+
+import eventlet
+import six
+from eventlet.queue import Queue
+from greenlet import GreenletExit
+from six.moves.urllib.parse import parse_qs
 from swift.common.swob import HTTPNotAcceptable
+from swift.proxy.controllers.base import clear_info_cache
 
 from functools import wraps
 try:
@@ -41,6 +51,182 @@ def get_listing_content_type(req):
     return req_format
 
 
+def parse_query(env):
+    """
+    Parse the query string of the request with parse_qs(), reusing the
+    result saved in `env` by a previous call (from another middleware)
+    if the query string has not changed since.
+    The returned dict is shared, and must not be modified.
+    """
+    query_string = env.get('QUERY_STRING', '')
+    parsed = env.get('oio.parsed_query')
+    if parsed is None or parsed[0] != query_string:
+        parsed = (query_string, parse_qs(query_string))
+        env['oio.parsed_query'] = parsed
+    return parsed[1]
+
+
+def swift3_versioned_object_name(object_name, version_id=None):
+    if version_id is not None:
+        version_id = '/%s' % version_id
+    return '%03x%s%s' % (len(object_name), object_name, version_id)
+
+
+def swift3_split_object_name_version(object_name):
+    if '/' not in object_name or \
+            len(object_name) < 3 or \
+            not object_name[:3].isdigit():
+        return object_name, None
+    return object_name[3:].rsplit('/', 1)
+
+
+def buffered_iter(iterable, size):
+    """
+    Coalesce the strings yielded by `iterable` into strings of at least
+    `size` bytes (except the last one), to avoid many tiny socket writes.
+    """
+    buf = []
+    buf_len = 0
+    for item in iterable:
+        buf.append(item)
+        buf_len += len(item)
+        if buf_len >= size:
+            yield ''.join(buf)
+            buf = []
+            buf_len = 0
+    if buf:
+        yield ''.join(buf)
+
+
+def iter_pages(first_page, next_page):
+    """
+    Yield `first_page`, then the pages returned by successive calls to
+    `next_page(previous_page)`, until it returns None. Each page is
+    requested in a green thread while the previous one is being consumed.
+    """
+    page = first_page
+    while page is not None:
+        pending = eventlet.spawn(next_page, page)
+        try:
+            yield page
+            page = pending.wait()
+        finally:
+            if not pending.dead:
+                pending.kill()
+
+
+class LRUCache(object):
+    """
+    In-process cache holding at most `size` entries, evicting the least
+    recently used ones first. Entries older than `ttl` seconds (if set)
+    are considered missing.
+    """
+
+    def __init__(self, size, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        try:
+            cached_at, value = self._entries.pop(key)
+        except KeyError:
+            return default
+        if self.ttl and cached_at + self.ttl < time.time():
+            return default
+        self._entries[key] = (cached_at, value)
+        return value
+
+    def set(self, key, value):
+        """
+        Cache `value` under `key`.
+
+        :returns: the number of entries evicted to make room for it
+        """
+        self._entries.pop(key, None)
+        self._entries[key] = (time.time(), value)
+        evicted = 0
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def pop(self, key, default=None):
+        try:
+            return self._entries.pop(key)[1]
+        except KeyError:
+            return default
+
+    def clear(self):
+        self._entries.clear()
+
+
+def read_chunks(source, size):
+    """Yield the data read from the file-like `source`, `size` at a time."""
+    while True:
+        data = source.read(size)
+        if not data:
+            break
+        yield data
+
+
+class ReadAheadIterator(object):
+    """
+    Iterate over `iterable` while a green thread reads up to `depth` items
+    ahead of the consumer. If `buffer_size` is set, the items are
+    coalesced into strings of at least `buffer_size` bytes.
+    Exceptions raised while reading are re-raised to the consumer.
+    """
+
+    _end = object()
+
+    def __init__(self, iterable, depth, buffer_size=None):
+        self.iterable = iterable
+        self.queue = Queue(max(1, depth))
+        if buffer_size:
+            self.reader = eventlet.spawn(
+                self._read, buffered_iter(iterable, buffer_size))
+        else:
+            self.reader = eventlet.spawn(self._read, iterable)
+
+    def _read(self, source):
+        try:
+            for item in source:
+                self.queue.put((item, None))
+        except GreenletExit:
+            raise
+        except BaseException:
+            self.queue.put((None, sys.exc_info()))
+        else:
+            self.queue.put((self._end, None))
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        item, exc_info = self.queue.get()
+        if exc_info is not None:
+            six.reraise(*exc_info)
+        if item is self._end:
+            # Let subsequent calls fail the same way
+            self.queue.put((item, None))
+            raise StopIteration
+        return item
+
+    __next__ = next
+
+    def close(self):
+        self.reader.kill()
+        if hasattr(self.iterable, 'close'):
+            self.iterable.close()
+
+
 def _mixed_join(iterable, sentinel):
     """concatenate any string type in an intelligent way."""
     iterator = iter(iterable)
@@ -51,54 +237,123 @@ def _mixed_join(iterable, sentinel):
 
 
 class IterO(object):
+    """
+    File-like object reading from a generator of strings.
+    Data is kept in a queue of chunks, and dropped as soon as it has been
+    read, so the memory footprint only depends on the size of the reads.
+    """
+
     def __init__(self, gen):
         self.gen = gen
         self.closed = False
-        self.pos = 0
         self.sentinel = ''
-        self.buf = None
-
-    def _buf_append(self, string):
-        if not self.buf:
-            self.buf = string
-        else:
-            self.buf += string
+        self._chunks = deque()
+        # Number of bytes of the first chunk already read
+        self._offset = 0
+        # Number of bytes queued and not read yet
+        self._available = 0
 
     def close(self):
         if not self.closed:
             self.closed = True
+            self._chunks.clear()
+            self._offset = self._available = 0
             if hasattr(self.gen, 'close'):
                 self.gen.close()
 
+    def _fill(self, n):
+        """Pull data from the generator until `n` bytes are available."""
+        while n < 0 or self._available < n:
+            try:
+                item = next(self.gen)
+            except StopIteration:
+                break
+            if item:
+                self._chunks.append(item)
+                self._available += len(item)
+
+    def _pop(self, n):
+        """Unqueue and return a list of up to `n` bytes of data."""
+        parts = []
+        while self._chunks and n != 0:
+            chunk = self._chunks[0]
+            end = len(chunk) if n < 0 else min(len(chunk), self._offset + n)
+            if self._offset == 0 and end == len(chunk):
+                parts.append(chunk)
+            else:
+                parts.append(chunk[self._offset:end])
+            if n >= 0:
+                n -= end - self._offset
+            self._available -= end - self._offset
+            if end == len(chunk):
+                self._chunks.popleft()
+                self._offset = 0
+            else:
+                self._offset = end
+        return parts
+
     def read(self, n=-1):
         if self.closed:
             raise ValueError('Closed file')
-        if n < 0:
-            self._buf_append(_mixed_join(self.buf, self.sentinel))
-            result = self.buf[self.pos:]
-            self.pos += len(result)
-            return result
-        new_pos = self.pos + n
-        buf = []
-        try:
-            tmp_end_pos = 0 if self.buf is None else len(self.buf)
-            while new_pos > tmp_end_pos or (self.buf is None and not buf):
-                item = next(self.gen)
-                tmp_end_pos += len(item)
-                buf.append(item)
-        except StopIteration:
-            pass
-        if buf:
-            self._buf_append(_mixed_join(buf, self.sentinel))
-
-        if self.buf is None:
+        self._fill(n)
+        parts = self._pop(n)
+        if not parts:
             return self.sentinel
+        return _mixed_join(parts, self.sentinel)
 
-        new_pos = max(0, new_pos)
-        try:
-            return self.buf[self.pos:new_pos]
-        finally:
-            self.pos = min(new_pos, len(self.buf))
+    def readinto(self, b):
+        """
+        Read up to len(b) bytes into the writable buffer `b`.
+
+        :returns: the number of bytes read (0 at end of stream)
+        """
+        if self.closed:
+            raise ValueError('Closed file')
+        self._fill(len(b))
+        pos = 0
+        for part in self._pop(len(b)):
+            b[pos:pos + len(part)] = part
+            pos += len(part)
+        return pos
+
+
+def get_container_cache_entry(app, account, container):
+    """
+    Get the entry of the in-process container cache for `container`,
+    creating it if needed.
+
+    :returns: a dict, or None when the cache is disabled
+    """
+    cache = app.container_cache
+    if cache is None:
+        return None
+    entry = cache.get((account, container))
+    if entry is None:
+        entry = dict()
+        evicted = cache.set((account, container), entry)
+        if evicted:
+            app.logger.update_stats('container_cache.eviction', evicted)
+    return entry
+
+
+def clear_account_cache(app, env, account):
+    """
+    Clear the cached info of `account`, from memcache and from the
+    in-process account cache.
+    """
+    clear_info_cache(app, env, account)
+    if app.account_info_cache is not None:
+        app.account_info_cache.pop(account)
+
+
+def clear_container_cache(app, env, account, container):
+    """
+    Clear the cached info of `container`, from memcache and from the
+    in-process container cache.
+    """
+    clear_info_cache(app, env, account, container)
+    if app.container_cache is not None:
+        app.container_cache.pop((account, container))
 
 
 def handle_service_busy(fnc):
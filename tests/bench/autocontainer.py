@@ -0,0 +1,135 @@
+# Copyright (C) 2017 OpenIO SAS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare the cost of the path conversion of the regexcontainer filter
+before (split_path() for each segment and parse_qs() for each request),
+with the single-pass conversion (path_cache_size = 0) and with the cache
+of converted paths, checking that all of them give the same paths.
+
+    python -m tests.bench.autocontainer [--objects 100] [--requests 10000]
+"""
+
+import argparse
+import random
+import timeit
+
+from six.moves.urllib.parse import parse_qs, quote_plus
+from swift.common.utils import config_true_value, split_path
+
+from oioswift.common.middleware.regexcontainer import \
+    RegexContainerMiddleware
+
+
+PATTERNS = [r'^app%d/(\d+)/(\d+)/' % i for i in range(9)] + [r'^([^/]+)/']
+
+
+class LegacyRegexContainerMiddleware(RegexContainerMiddleware):
+    """The filter as it was before the paths were converted in one pass."""
+
+    def should_bypass(self, env):
+        header = env.get(self.bypass_header_key, "").lower()
+        query = parse_qs(env.get('QUERY_STRING', "")).get(self.BYPASS_QS,
+                                                          [""])
+        return config_true_value(header) or config_true_value(query[0])
+
+    def _convert_path(self, path):
+        account = self.account
+        obj = path[1:]
+        container = None
+
+        if self.strip_v1:
+            version, tail = split_path('/' + obj, 1, 2, True)
+            if version in ('v1', 'v1.0'):
+                obj = tail
+
+        if self.account_first:
+            account, tail = split_path('/' + obj, 1, 2, True)
+            obj = tail
+
+        if obj is not None and self.swift3_compat:
+            container, tail = split_path('/' + obj, 1, 2, True)
+            obj = tail
+
+        if obj is None:
+            return account, container, None
+
+        container = quote_plus(self.con_builder(obj))
+        return account, container, obj
+
+
+def app(env, start_response):
+    return env['PATH_INFO']
+
+
+def make_requests(objects, count, seed=0):
+    """
+    Environments of `count` requests on `objects` distinct objects,
+    a few of them with a query string.
+    """
+    rand = random.Random(seed)
+    paths = ['/v1/AUTH_test/app%d/%d/%d/obj%d' % (
+        rand.randint(0, 8), rand.randint(0, 999), rand.randint(0, 999), i)
+        for i in range(objects)]
+    requests = []
+    for _ in range(count):
+        env = {'PATH_INFO': rand.choice(paths),
+               'REQUEST_METHOD': 'GET'}
+        if rand.random() < 0.1:
+            env['QUERY_STRING'] = 'multipart-manifest=get'
+        requests.append(env)
+    return requests
+
+
+def handle_all(filter_, requests):
+    # The filter modifies PATH_INFO, give it a copy of each environment
+    return [filter_(dict(env), None) for env in requests]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--objects', type=int, default=100,
+                        help='number of distinct objects requested')
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    requests = make_requests(args.objects, args.requests)
+    filters = [
+        ('before', LegacyRegexContainerMiddleware),
+        ('single-pass', lambda *a, **kw: RegexContainerMiddleware(
+            *a, path_cache_size=0, **kw)),
+        ('cached', RegexContainerMiddleware)]
+    expected = None
+    print('%-12s %10s %8s' % ('', 'us/req', 'speedup'))
+    for name, filter_class in filters:
+        filter_ = filter_class(app, 'AUTH_test', PATTERNS,
+                               strip_v1=True, account_first=True)
+        paths = handle_all(filter_, requests)
+        if expected is None:
+            expected = paths
+        elif paths != expected:
+            raise AssertionError('%s gives different paths' % name)
+        elapsed = min(timeit.repeat(lambda: handle_all(filter_, requests),
+                                    repeat=args.repeat, number=1))
+        per_request = elapsed * 1e6 / len(requests)
+        if name == 'before':
+            baseline = per_request
+        print('%-12s %10.2f %7.1fx' % (
+            name, per_request, baseline / per_request))
+
+
+if __name__ == '__main__':
+    main()
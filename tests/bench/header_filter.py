@@ -0,0 +1,131 @@
+# Copyright (C) 2017 OpenIO SAS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare the filtering of object metadata before (is_sys_or_user_meta()
+and a lowercase lookup for each key) and after the memoized HeaderFilter,
+for the properties of a GET/HEAD and the request headers of a PUT/POST,
+checking that both give the same result.
+
+    python -m tests.bench.header_filter [--metadata 5,20,100]
+"""
+
+import argparse
+import timeit
+
+from swift.common.header_key_dict import HeaderKeyDict
+from swift.common.request_helpers import is_sys_or_user_meta
+
+from oioswift.proxy.controllers.obj import ObjectController
+
+
+ALLOWED_HEADERS = ObjectController.allowed_headers
+
+REQUEST_HEADERS = {
+    'Host': 'localhost:5000',
+    'User-Agent': 'python-swiftclient-3.4.0',
+    'Accept-Encoding': 'gzip, deflate',
+    'Accept': '*/*',
+    'Connection': 'keep-alive',
+    'X-Auth-Token': 'AUTH_tk0123456789abcdef0123456789abcdef',
+    'Content-Length': '1048576',
+    'Content-Type': 'application/octet-stream',
+    'Etag': 'd41d8cd98f00b204e9800998ecf8427e',
+    'X-Timestamp': '1500000000.00000',
+    'X-Trans-Id': 'tx0123456789abcdef01234-0059f3c2a1',
+    'Content-Disposition': 'attachment; filename="o"',
+    'X-Object-Sysmeta-Version-Id': '1500000000000000',
+}
+
+
+def legacy_response_headers(properties):
+    headers = dict()
+    for k, v in properties.iteritems():
+        if is_sys_or_user_meta('object', k) or \
+                k.lower() in ALLOWED_HEADERS:
+            headers[str(k)] = v
+    return headers
+
+
+def legacy_load_object_metadata(headers):
+    metadata = {}
+    metadata.update(
+        (k.lower(), v) for k, v in headers.iteritems()
+        if is_sys_or_user_meta('object', k))
+    for header_key in ALLOWED_HEADERS:
+        if header_key in headers:
+            metadata[header_key.lower()] = headers[header_key]
+    return metadata
+
+
+def response_headers(controller, properties):
+    # Same loop as ObjectController.make_object_response()
+    headers = dict()
+    metadata_filter = controller.metadata_filter
+    for k, v in properties.iteritems():
+        if metadata_filter(k):
+            headers[str(k)] = v
+    return headers
+
+
+def make_headers(count):
+    # Case-insensitive, like the headers of a swob request
+    headers = HeaderKeyDict(REQUEST_HEADERS)
+    for i in range(count):
+        headers['X-Object-Meta-Key%d' % i] = 'value%d' % i
+    return headers
+
+
+def best_time(func, arg, repeat, number):
+    """Best time of a call, in microseconds."""
+    return min(timeit.repeat(lambda: func(arg), repeat=repeat,
+                             number=number)) * 1e6 / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--metadata', default='5,20,100',
+                        help='numbers of user metadata of the object')
+    parser.add_argument('--number', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # The filter only needs the class attributes
+    controller = ObjectController.__new__(ObjectController)
+    print('%8s %-10s %12s %12s %8s' % (
+        'metadata', '', 'before (us)', 'after (us)', 'speedup'))
+    for count in [int(c) for c in args.metadata.split(',')]:
+        headers = make_headers(count)
+        # Object properties, as saved by a PUT (lowercase names)
+        properties = controller.load_object_metadata(headers)
+        if legacy_load_object_metadata(headers) != properties:
+            raise AssertionError('PUT metadata differ')
+        if legacy_response_headers(properties) != \
+                response_headers(controller, properties):
+            raise AssertionError('GET headers differ')
+
+        for name, before, after, arg in (
+                ('GET/HEAD', legacy_response_headers,
+                 lambda p: response_headers(controller, p), properties),
+                ('PUT/POST', legacy_load_object_metadata,
+                 controller.load_object_metadata, headers)):
+            old = best_time(before, arg, args.repeat, args.number)
+            new = best_time(after, arg, args.repeat, args.number)
+            print('%8d %-10s %12.2f %12.2f %7.1fx' % (
+                count, name, old, new, old / new))
+
+
+if __name__ == '__main__':
+    main()
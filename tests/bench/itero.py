@@ -0,0 +1,139 @@
+# Copyright (C) 2017 OpenIO SAS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pass a large upload through IterO in small reads, as the rawx writers do,
+and report its throughput and the growth of the resident memory. The
+previous implementation (which kept all the data read) is run on a
+smaller body for comparison.
+
+    python -m tests.bench.itero [--size-mb 5120] [--legacy-size-mb 32]
+"""
+
+import argparse
+import resource
+import time
+
+from oioswift.utils import IterO, _mixed_join
+
+
+class LegacyIterO(object):
+    """IterO as it was before the consumed data was dropped."""
+
+    def __init__(self, gen):
+        self.gen = gen
+        self.pos = 0
+        self.sentinel = ''
+        self.buf = None
+
+    def _buf_append(self, string):
+        if not self.buf:
+            self.buf = string
+        else:
+            self.buf += string
+
+    def read(self, n=-1):
+        new_pos = self.pos + n
+        buf = []
+        try:
+            tmp_end_pos = 0 if self.buf is None else len(self.buf)
+            while new_pos > tmp_end_pos or (self.buf is None and not buf):
+                item = next(self.gen)
+                tmp_end_pos += len(item)
+                buf.append(item)
+        except StopIteration:
+            pass
+        if buf:
+            self._buf_append(_mixed_join(buf, self.sentinel))
+        if self.buf is None:
+            return self.sentinel
+        new_pos = max(0, new_pos)
+        try:
+            return self.buf[self.pos:new_pos]
+        finally:
+            self.pos = min(new_pos, len(self.buf))
+
+
+def rss_kb():
+    """Current resident memory, in kB."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def upload(size, chunk_size):
+    chunk = 'X' * chunk_size
+    sent = 0
+    while sent < size:
+        data = chunk[:size - sent]
+        sent += len(data)
+        yield data
+
+
+def run(reader_class, size, chunk_size, read_size, use_readinto=False):
+    """
+    :returns: the throughput (MB/s) and the peak growth of the
+        resident memory (MB)
+    """
+    reader = reader_class(upload(size, chunk_size))
+    buf = bytearray(read_size)
+    start_rss = peak_rss = rss_kb()
+    start = time.time()
+    received = reads = 0
+    while True:
+        if use_readinto:
+            count = reader.readinto(buf)
+        else:
+            count = len(reader.read(read_size))
+        if not count:
+            break
+        received += count
+        reads += 1
+        if not reads % 1024:
+            peak_rss = max(peak_rss, rss_kb())
+    elapsed = time.time() - start
+    if received != size:
+        raise AssertionError('%d bytes read instead of %d' % (
+            received, size))
+    return size / elapsed / 1024 / 1024, (peak_rss - start_rss) / 1024.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size-mb', type=int, default=1024)
+    parser.add_argument('--legacy-size-mb', type=int, default=32)
+    parser.add_argument('--chunk-size', type=int, default=65536,
+                        help='size of the chunks received from the client')
+    parser.add_argument('--read-size', type=int, default=8192)
+    args = parser.parse_args()
+
+    print('%-16s %8s %10s %14s' % ('', 'size MB', 'MB/s', 'RSS growth MB'))
+    for name, reader_class, size_mb, use_readinto in (
+            ('IterO.read', IterO, args.size_mb, False),
+            ('IterO.readinto', IterO, args.size_mb, True),
+            ('legacy read', LegacyIterO, args.legacy_size_mb, False)):
+        rate, growth = run(reader_class, size_mb * 1024 * 1024,
+                           args.chunk_size, args.read_size,
+                           use_readinto=use_readinto)
+        print('%-16s %8d %10.1f %14.1f' % (name, size_mb, rate, growth))
+
+
+if __name__ == '__main__':
+    main()
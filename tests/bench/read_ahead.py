@@ -0,0 +1,97 @@
+# Copyright (C) 2017 OpenIO SAS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare the download of an object from the raw oio stream (the baseline,
+download_read_ahead = 0) and through ReadAheadIterator, with a simulated
+latency for each read from the rawx services and each write to the client.
+
+    python -m tests.bench.read_ahead [--size-mb 64] [--depth 4]
+"""
+
+import argparse
+import resource
+import time
+
+import eventlet
+
+from oioswift.utils import ReadAheadIterator
+
+
+def rawx_stream(size, chunk_size, latency):
+    """Yield `size` bytes in chunks of `chunk_size` bytes, like oio does."""
+    chunk = 'X' * chunk_size
+    sent = 0
+    while sent < size:
+        eventlet.sleep(latency)
+        data = chunk[:size - sent]
+        sent += len(data)
+        yield data
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def download(app_iter, latency):
+    """
+    Consume `app_iter` like the WSGI server, each write taking `latency`
+    seconds plus the time needed to send its data.
+
+    :returns: the number of bytes, the number of writes, the elapsed
+        and CPU times
+    """
+    start, start_cpu = time.time(), cpu_time()
+    size = writes = 0
+    for data in app_iter:
+        eventlet.sleep(latency)
+        size += len(data)
+        writes += 1
+    return size, writes, time.time() - start, cpu_time() - start_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size-mb', type=int, default=64)
+    parser.add_argument('--rawx-chunk', type=int, default=8192,
+                        help='size of the reads from the rawx services')
+    parser.add_argument('--client-chunk', type=int, default=65536,
+                        help='client_chunk_size')
+    parser.add_argument('--depth', type=int, default=4,
+                        help='download_read_ahead')
+    parser.add_argument('--rawx-latency', type=float, default=0.00002)
+    parser.add_argument('--client-latency', type=float, default=0.0001)
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    print('%-12s %10s %8s %12s' % ('', 'MB/s', 'writes', 'CPU us/MB'))
+    for name in ('baseline', 'read-ahead'):
+        stream = rawx_stream(size, args.rawx_chunk, args.rawx_latency)
+        if name == 'read-ahead':
+            stream = ReadAheadIterator(stream, args.depth,
+                                       buffer_size=args.client_chunk)
+        received, writes, elapsed, cpu = download(
+            stream, args.client_latency)
+        if received != size:
+            raise AssertionError('%d bytes received instead of %d' % (
+                received, size))
+        print('%-12s %10.1f %8d %12.1f' % (
+            name, args.size_mb / elapsed, writes,
+            cpu * 1e6 / args.size_mb))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# Copyright (C) 2017 OpenIO SAS
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare the cost of RegexContainerBuilder (one search() per pattern) and
+CombinedRegexContainerBuilder (a single match() call) as the number of
+patterns grows, checking that both give the same container names.
+
+    python -m tests.bench.regexcontainer [--max-patterns 100] [--step 10]
+                                         [--unanchored]
+"""
+
+import argparse
+import random
+import timeit
+
+from oio.common.autocontainer import RegexContainerBuilder
+from oioswift.common.middleware.regexcontainer import \
+    CombinedRegexContainerBuilder
+
+
+def make_patterns(count, anchored=True):
+    """
+    Patterns in the style of a deployment configuration: one prefix of
+    object names per application, the last one matching anything.
+    """
+    anchor = '^' if anchored else ''
+    patterns = [anchor + r'app%d/(\d+)/(\d+)/' % i
+                for i in range(count - 1)]
+    patterns.append(anchor + r'([^/]+)/')
+    return patterns
+
+
+def make_paths(count, size, seed=0):
+    """Object names matching each pattern, or none of them."""
+    rand = random.Random(seed)
+    paths = []
+    for _ in range(size):
+        app = rand.randint(0, count)
+        if app < count - 1:
+            paths.append('app%d/%d/%d/obj' % (
+                app, rand.randint(0, 999), rand.randint(0, 999)))
+        elif app == count - 1:
+            paths.append('other%d/obj' % rand.randint(0, 999))
+        else:
+            paths.append('no_match')
+    return paths
+
+
+def convert_all(builder, paths):
+    names = []
+    for path in paths:
+        try:
+            names.append(builder(path))
+        except ValueError:
+            names.append(None)
+    return names
+
+
+def bench(count, paths_count, repeat, anchored=True):
+    patterns = make_patterns(count, anchored=anchored)
+    paths = make_paths(count, paths_count)
+    builders = (RegexContainerBuilder(patterns),
+                CombinedRegexContainerBuilder(patterns))
+    expected = convert_all(builders[0], paths)
+    for builder in builders[1:]:
+        if convert_all(builder, paths) != expected:
+            raise AssertionError(
+                '%s gives different names with %d patterns' % (
+                    type(builder).__name__, count))
+    # Best time per path, in microseconds
+    return [min(timeit.repeat(lambda: convert_all(builder, paths),
+                              repeat=repeat, number=1)) * 1e6 / len(paths)
+            for builder in builders]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--max-patterns', type=int, default=100)
+    parser.add_argument('--step', type=int, default=10)
+    parser.add_argument('--paths', type=int, default=10000,
+                        help='number of object names converted per run')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--unanchored', action='store_true',
+                        help='do not anchor the patterns with ^')
+    args = parser.parse_args()
+
+    print('%8s %14s %14s %8s' % ('patterns', 'regex (us)', 'combined (us)',
+                                 'speedup'))
+    counts = sorted(set([1] + range(args.step, args.max_patterns + 1,
+                                    args.step)))
+    for count in counts:
+        linear, combined = bench(count, args.paths, args.repeat,
+                                 anchored=not args.unanchored)
+        print('%8d %14.3f %14.3f %7.1fx' % (
+            count, linear, combined, linear / combined))
+
+
+if __name__ == '__main__':
+    main()
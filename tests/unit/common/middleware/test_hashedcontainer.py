@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import patch
+
+from oioswift.common.middleware import hashedcontainer
+from oioswift.common.middleware.hashedcontainer import \
+    HashedContainerMiddleware, SharedFlatNsBuilder, get_flatns_builder
+
+
+class TestSharedFlatNsBuilder(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.path, 'sub', 'flatns.json')
+        self.conf = {'offset': 0, 'size': None, 'bits': 8}
+        hashedcontainer._FLATNS_BUILDERS.clear()
+
+    def tearDown(self):
+        hashedcontainer._FLATNS_BUILDERS.clear()
+        shutil.rmtree(self.path)
+
+    def _patch_load(self, **kwargs):
+        kwargs.setdefault('return_value', self.conf)
+        return patch('oioswift.common.middleware.hashedcontainer.'
+                     'load_flatns_conf', **kwargs)
+
+    def test_cache_path(self):
+        with self._patch_load() as load:
+            builder = SharedFlatNsBuilder('NS', 'proxy',
+                                          cache_path=self.cache_path)
+            self.assertEqual(1, load.call_count)
+        self.assertTrue(os.path.isfile(self.cache_path))
+
+        # Next time, the configuration is loaded from the file
+        with self._patch_load() as load:
+            cached = SharedFlatNsBuilder('NS', 'proxy',
+                                         cache_path=self.cache_path)
+            self.assertEqual(0, load.call_count)
+        self.assertEqual(builder('obj'), cached('obj'))
+
+    def test_refresh_in_background(self):
+        with self._patch_load():
+            builder = SharedFlatNsBuilder('NS', 'proxy', refresh_interval=60)
+        name = builder('obj')
+        self.assertEqual(1, builder.generation)
+        builder.loaded_at = time.time() - 61
+        conf = dict(self.conf, bits=4)
+        with self._patch_load(return_value=conf) as load:
+            # The previous configuration is used until refreshed
+            self.assertEqual(name, builder('obj'))
+            builder._refresher.wait()
+            self.assertEqual(1, load.call_count)
+        self.assertEqual(2, builder.generation)
+        self.assertNotEqual(name, builder('obj'))
+
+    def test_shared(self):
+        with self._patch_load() as load:
+            builder = get_flatns_builder('NS', 'proxy')
+            self.assertIs(builder, get_flatns_builder('NS', 'proxy'))
+            self.assertIsNot(builder, get_flatns_builder('NS2', 'proxy'))
+            self.assertEqual(2, load.call_count)
+
+    def test_middleware_path_cache(self):
+        with self._patch_load():
+            mw = HashedContainerMiddleware(None, 'NS', 'AUTH_test', 'proxy')
+        account, container, obj = mw._convert_path('/obj')
+        self.assertEqual(('AUTH_test', 'obj'), (account, obj))
+        with self._patch_load(return_value=dict(self.conf, bits=4)):
+            mw.con_builder.refresh()
+        self.assertNotEqual(container, mw._convert_path('/obj')[1])
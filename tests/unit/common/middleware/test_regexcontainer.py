@@ -0,0 +1,146 @@
+import unittest
+
+from swift.common.swob import Request, Response
+from swift.common.utils import split_path
+
+from oioswift.common.middleware.autocontainerbase import _split_first
+from oio.common.autocontainer import RegexContainerBuilder
+from oioswift.common.middleware.regexcontainer import \
+    CombinedRegexContainerBuilder, RegexContainerMiddleware
+
+
+class FakeApp(object):
+    def __init__(self):
+        self.paths = []
+
+    def __call__(self, env, start_response):
+        self.paths.append(env['PATH_INFO'])
+        return Response(status=204)(env, start_response)
+
+
+class TestRegexContainer(unittest.TestCase):
+    def setUp(self):
+        self.app = FakeApp()
+        self.mw = RegexContainerMiddleware(
+            self.app, 'AUTH_test', [r'/(\d+)/(\d+)/', r'^([^/]+)'],
+            strip_v1=True, account_first=True)
+
+    def _call(self, path, **kwargs):
+        resp = Request.blank(path, **kwargs).get_response(self.mw)
+        self.assertEqual(204, resp.status_int)
+        return self.app.paths[-1]
+
+    def test_split_first(self):
+        for path in ('a', 'a/', 'a/b', 'a/b/c', 'a//b', '', '/', '/a'):
+            try:
+                expected = split_path('/' + path, 1, 2, True)
+            except ValueError:
+                self.assertRaises(ValueError, _split_first, path)
+            else:
+                self.assertEqual(tuple(expected), _split_first(path))
+
+    def test_convert_path(self):
+        self.assertEqual('/v1/AUTH_test/124/1/12/4/o',
+                         self._call('/v1/AUTH_test/1/12/4/o'))
+        self.assertEqual('/v1/AUTH_test/dir/dir/o',
+                         self._call('/AUTH_test/dir/o'))
+        # Account requests are left untouched
+        self.assertEqual('/v1/AUTH_test', self._call('/v1/AUTH_test'))
+
+    def test_path_cache(self):
+        calls = []
+        builder = self.mw.con_builder
+
+        def con_builder(obj):
+            calls.append(obj)
+            return builder(obj)
+
+        self.mw.con_builder = con_builder
+        for _ in range(3):
+            self.assertEqual('/v1/AUTH_test/dir/dir/o',
+                             self._call('/v1/AUTH_test/dir/o'))
+        self.assertEqual(['dir/o'], calls)
+
+        self.mw.path_cache = None
+        self.assertEqual('/v1/AUTH_test/dir/dir/o',
+                         self._call('/v1/AUTH_test/dir/o'))
+        self.assertEqual(['dir/o', 'dir/o'], calls)
+
+    def test_bypass(self):
+        self.assertEqual('/v1/AUTH_test/dir/o',
+                         self._call('/v1/AUTH_test/dir/o',
+                                    headers={'X-Bypass-Autocontainer': 'y'}))
+        self.assertEqual(
+            '/v1/AUTH_test/dir/o',
+            self._call('/v1/AUTH_test/dir/o?bypass-autocontainer=true'))
+        self.assertEqual(
+            '/v1/AUTH_test/dir/dir/o',
+            self._call('/v1/AUTH_test/dir/o?bypass-autocontainer=no'))
+
+    def test_bypass_query_not_parsed(self):
+        env = {'QUERY_STRING': 'format=json&prefix=a'}
+        self.assertFalse(self.mw.should_bypass(env))
+        self.assertNotIn('oio.parsed_query', env)
+        env = {'QUERY_STRING': 'format=json&bypass-autocontainer=1'}
+        self.assertTrue(self.mw.should_bypass(env))
+        self.assertIn('oio.parsed_query', env)
+
+    def test_bypass_query_encoded(self):
+        env = {'QUERY_STRING': 'format=json&%62ypass-autocontainer=1'}
+        self.assertTrue(self.mw.should_bypass(env))
+        env = {'QUERY_STRING': 'prefix=a%2Fb'}
+        self.assertFalse(self.mw.should_bypass(env))
+
+
+class TestCombinedRegexContainerBuilder(unittest.TestCase):
+    PATHS = ['1/12/4/o', 'dir/o', 'a/b/c', 'abc', '/x', '12', 'a-b/c',
+             'AUTH_test/10/20/30/obj', 'no_match!']
+
+    def _check_same(self, patterns, builder=''.join):
+        expected = RegexContainerBuilder(patterns, builder=builder)
+        builder = CombinedRegexContainerBuilder(patterns, builder=builder)
+        for path in self.PATHS:
+            try:
+                name = expected(path)
+            except ValueError:
+                self.assertRaises(ValueError, builder, path)
+            else:
+                self.assertEqual(name, builder(path), path)
+        return builder
+
+    def test_same_as_regex_builder(self):
+        builder = self._check_same(
+            [r'/(\d+)/(\d+)/', r'^([a-z])/(b)', r'(\d)(\d)$',
+             r'^([^/]+)$', r'c|(b)/(c)', r'^(a)-', r'(?:x)'])
+        self.assertEqual(7, len(builder.regexes))
+
+    def test_first_pattern_wins(self):
+        # The second pattern matches earlier in the path,
+        # but the first one takes precedence
+        self._check_same([r'/(o)$', r'^(\d+)'])
+
+    def test_anchored_patterns(self):
+        builder = self._check_same(
+            [r'^(\d+)/', r'^(?:a|b)(/c)', r'^([^/]+)$', r'^q|c$',
+             r'(?i)^(ABC)', r'^/(x)', r'^(a)-'])
+        # Not anchored: the alternation applies to the whole pattern
+        self.assertEqual(4, len(builder.regexes))
+
+    def test_uncombinable_patterns(self):
+        builder = self._check_same(
+            [r'^(\d)/\1', r'(?P<first>[a-z]+)/', r'(?i)^(ABC)', r'(.)'])
+        self.assertEqual(4, len(builder.regexes))
+
+    def test_conditional_group_reference(self):
+        # Group 1 would be the one of the first pattern once combined
+        builder = self._check_same(
+            [r'^(\d+)/', r'^(a)?(?(1)/b|bc)'],
+            builder=lambda groups: ''.join(g or '' for g in groups))
+        self.assertEqual(2, len(builder.regexes))
+
+    def test_many_groups(self):
+        patterns = [r'^%s(x)(%s)' % ('(z)' * 10, i) for i in range(20)]
+        patterns.append(r'^(\d+)')
+        builder = self._check_same(patterns)
+        self.assertGreater(len(builder.regexes), 1)
+        self.assertEqual('12', builder('12'))
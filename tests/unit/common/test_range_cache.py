@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+from mock import patch
+
+from oioswift.common.range_cache import RangeCache
+
+
+class TestRangeCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_get_put(self):
+        cache = RangeCache(self.path, 1000, block_size=10)
+        key = ('a', 'c', 'o', 42)
+        self.assertIsNone(cache.get(key, 0))
+        cache.put(key, 0, 'X' * 10)
+        self.assertEqual('X' * 10, cache.get(key, 0))
+        self.assertIsNone(cache.get(key, 1))
+        self.assertIsNone(cache.get(('a', 'c', 'o', 43), 0))
+
+    def test_cleanup(self):
+        cache = RangeCache(self.path, 20, block_size=10)
+        key = ('a', 'c', 'o', 42)
+        for index in range(3):
+            cache.put(key, index, 'X' * 10)
+            path = cache._block_path(key, index)
+            os.utime(path, (index, index))
+        cache._cleaner.wait()
+        self.assertIsNone(cache.get(key, 0))
+        self.assertEqual('X' * 10, cache.get(key, 1))
+        self.assertEqual('X' * 10, cache.get(key, 2))
+
+    def test_cleanup_once(self):
+        cache = RangeCache(self.path, 20, block_size=10)
+        key = ('a', 'c', 'o', 42)
+        with patch.object(cache, 'cleanup') as cleanup:
+            for index in range(3):
+                cache.put(key, index, 'X' * 10)
+            cache._cleaner.wait()
+        # Not started again while the first one is running
+        self.assertEqual(1, cleanup.call_count)
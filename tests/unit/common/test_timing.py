@@ -0,0 +1,65 @@
+import unittest
+
+import eventlet
+from mock import MagicMock as Mock
+
+from oioswift.common.timing import TIMING_ENV_KEY, TimedStorage
+
+
+class TestTimedStorage(unittest.TestCase):
+    def setUp(self):
+        self.logger = Mock()
+        self.api = Mock()
+        self.storage = TimedStorage(self.api, self.logger)
+
+    def _timing_metrics(self):
+        return [call[0][0] for call in self.logger.timing.call_args_list]
+
+    def test_call(self):
+        self.api.object_show.return_value = {'hash': 'abc'}
+        self.assertEqual({'hash': 'abc'},
+                         self.storage.object_show('a', 'c', 'o'))
+        self.api.object_show.assert_called_once_with('a', 'c', 'o')
+        self.assertEqual(['storage.object_show.ok.timing'],
+                         self._timing_metrics())
+
+    def test_call_error(self):
+        self.api.object_show.side_effect = KeyError('o')
+        self.assertRaises(KeyError, self.storage.object_show, 'a', 'c', 'o')
+        self.assertEqual(['storage.object_show.KeyError.timing'],
+                         self._timing_metrics())
+
+    def test_sub_client(self):
+        self.storage.account.container_list('a')
+        self.api.account.container_list.assert_called_once_with('a')
+        self.assertEqual(['storage.account.container_list.ok.timing'],
+                         self._timing_metrics())
+
+    def test_request(self):
+        env = dict()
+        self.storage.object_list('a', 'c')
+        previous = self.storage.start_request(env)
+        self.assertIsNone(previous)
+        self.storage.object_show('a', 'c', 'o')
+        sub_env = dict()
+        sub_previous = self.storage.start_request(sub_env)
+        self.assertIs(env[TIMING_ENV_KEY], sub_previous)
+        self.storage.object_delete('a', 'c', 'o')
+        self.storage.end_request(sub_previous)
+        self.storage.object_fetch('a', 'c', 'o')
+        self.storage.end_request(previous)
+        self.storage.object_create('a', 'c', 'o')
+        self.assertEqual(['object_show', 'object_fetch'],
+                         [name for name, _ in env[TIMING_ENV_KEY].calls])
+        self.assertEqual(['object_delete'],
+                         [name for name, _ in sub_env[TIMING_ENV_KEY].calls])
+
+    def test_bind(self):
+        env = dict()
+        previous = self.storage.start_request(env)
+        func = self.storage.bind(self.storage.object_show)
+        self.storage.end_request(previous)
+        eventlet.spawn(func, 'a', 'c', 'o').wait()
+        self.storage.object_delete('a', 'c', 'o')
+        self.assertEqual(['object_show'],
+                         [name for name, _ in env[TIMING_ENV_KEY].calls])
@@ -1,12 +1,18 @@
+import json
 import unittest
 from mock import MagicMock as Mock
+from mock import patch
+
+import eventlet
 
 from swift.common import constraints
 from swift.common.swob import Request
 from swift.common.request_helpers import get_sys_meta_prefix
 from swift.proxy.controllers.base import headers_to_account_info
+from oio.common import exceptions as exc
 from oioswift.common.ring import FakeRing
 from oioswift import server as proxy_server
+from oioswift.utils import LRUCache
 from tests.unit import FakeStorageAPI, FakeMemcache, debug_logger
 
 
@@ -67,6 +73,200 @@ class TestAccountController(unittest.TestCase):
         for key in owner_headers:
             self.assertTrue(key in resp.headers)
 
+    def test_bulk_delete(self):
+        self.storage.account_show = Mock(return_value=get_fake_info())
+
+        def container_get_properties(account, container, **kwargs):
+            if container == 'missing':
+                raise exc.NoSuchContainer()
+            return {'properties': {}, 'system': {}}
+        self.storage.container.container_get_properties = Mock(
+            side_effect=container_get_properties)
+
+        def object_delete(account, container, obj, **kwargs):
+            if obj == 'o2':
+                raise exc.NoSuchObject()
+        self.storage.object_delete = Mock(side_effect=object_delete)
+        self.storage.container_delete = Mock(
+            side_effect=exc.ContainerNotEmpty())
+
+        req = Request.blank(
+            '/v1/a?bulk-delete', method='POST',
+            headers={'Accept': 'application/json',
+                     'Content-Type': 'text/plain'},
+            body='c1/o1\nc1/o2\n/c2/o%203\nmissing/o4\nc1\n')
+        resp = req.get_response(self.app)
+        self.assertEqual(200, resp.status_int)
+        result = json.loads(resp.body)
+        self.assertEqual(2, result['Number Deleted'])
+        self.assertEqual(2, result['Number Not Found'])
+        self.assertEqual([['c1', '409 Conflict']], result['Errors'])
+        self.assertEqual('400 Bad Request', result['Response Status'])
+        self.assertEqual(
+            [('a', 'c1', 'o1'), ('a', 'c1', 'o2'), ('a', 'c2', 'o 3')],
+            [call[0] for call in self.storage.object_delete.call_args_list])
+        self.storage.container_delete.assert_called_once_with('a', 'c1')
+
+    def test_bulk_delete_containers_after_objects(self):
+        self.storage.account_show = Mock(return_value=get_fake_info())
+        self.storage.container.container_get_properties = Mock(
+            return_value={'properties': {}, 'system': {}})
+        remaining = {'c1': {'o1', 'o2', 'o3'}}
+
+        def object_delete(account, container, obj, **kwargs):
+            eventlet.sleep(0.01)
+            remaining[container].discard(obj)
+
+        def container_delete(account, container, **kwargs):
+            if remaining[container]:
+                raise exc.ContainerNotEmpty()
+            if container == 'c1':
+                raise exc.ServiceUnavailable()
+        self.storage.object_delete = Mock(side_effect=object_delete)
+        self.storage.container_delete = Mock(side_effect=container_delete)
+
+        req = Request.blank(
+            '/v1/a?bulk-delete', method='POST',
+            headers={'Accept': 'application/json',
+                     'Content-Type': 'text/plain'},
+            body='c1/o1\nc1/o2\nc1/o3\nc1\n')
+        resp = req.get_response(self.app)
+        self.assertEqual(200, resp.status_int)
+        result = json.loads(resp.body)
+        self.assertEqual(3, result['Number Deleted'])
+        # Not a 409: the container was empty, but the backend failed
+        self.assertEqual([['c1', '500 Internal Error']], result['Errors'])
+        self.assertEqual('502 Bad Gateway', result['Response Status'])
+
+    def _listing_info(self, listing):
+        info = get_fake_info()
+        info['listing'] = listing
+        return info
+
+    def _check_listing_streamed(self, listing):
+        for fmt in ('json', 'plain', 'xml'):
+            self.app.stream_listings = False
+            self.storage.account.container_list = Mock(
+                return_value=self._listing_info(list(listing)))
+            req = Request.blank('/v1/a?format=%s' % fmt, method='GET')
+            expected = req.get_response(self.app)
+
+            self.app.stream_listings = True
+            self.storage.account.container_list = Mock(
+                return_value=self._listing_info(list(listing)))
+            req = Request.blank('/v1/a?format=%s' % fmt, method='GET')
+            resp = req.get_response(self.app)
+            self.assertEqual(expected.status_int, resp.status_int)
+            self.assertEqual(expected.content_type, resp.content_type)
+            self.assertEqual(expected.body, resp.body)
+
+    def test_GET_listing_streaming(self):
+        listing = [['c1', 1, 10, 0], [u'c\xe9<', 2, 20, 0], ['d-', 0, 0, 1]]
+        self._check_listing_streamed(listing)
+
+    def test_GET_listing_streaming_same_body(self):
+        self._check_listing_streamed([])
+        self._check_listing_streamed([['c1', 1, 10, 0]])
+
+    def test_GET_listing_paginated(self):
+        self.app.account_listing_max_limit = 100000
+        self.app.stream_listings = True
+        first = [['c%05d' % i, 0, 0, 0] for i in range(10000)]
+        self.storage.account.container_list = Mock(side_effect=[
+            self._listing_info(first),
+            self._listing_info([['d', 0, 0, 0]])])
+        req = Request.blank('/v1/a?format=plain&limit=20000', method='GET')
+        resp = req.get_response(self.app)
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(10001, len(resp.body.splitlines()))
+        first_call, second_call = \
+            self.storage.account.container_list.call_args_list
+        self.assertEqual(10000, first_call[1]['limit'])
+        self.assertEqual('c09999', second_call[1]['marker'])
+        self.assertEqual(10000, second_call[1]['limit'])
+
+        req = Request.blank('/v1/a?limit=100001', method='GET')
+        resp = req.get_response(self.app)
+        self.assertEqual(412, resp.status_int)
+
+    def test_GET_listing_paginated_delimiter(self):
+        self.app.account_listing_max_limit = 100000
+        self.app.stream_listings = True
+        first = [['p%05d' % i, 0, 0, 0] for i in range(9999)]
+        first.append(['pz-', 0, 0, 1])
+        self.storage.account.container_list = Mock(side_effect=[
+            self._listing_info(first),
+            self._listing_info([['pz.a', 0, 0, 0]])])
+        req = Request.blank(
+            '/v1/a?format=plain&limit=20000&prefix=p&delimiter=-',
+            method='GET')
+        resp = req.get_response(self.app)
+        self.assertEqual(200, resp.status_int)
+        lines = resp.body.splitlines()
+        self.assertEqual(10001, len(lines))
+        self.assertEqual(['pz-', 'pz.a'], lines[-2:])
+        first_call, second_call = \
+            self.storage.account.container_list.call_args_list
+        for call in (first_call, second_call):
+            self.assertEqual('p', call[1]['prefix'])
+            self.assertEqual('-', call[1]['delimiter'])
+        # Nothing more to list below the last prefix
+        self.assertEqual('pz.', second_call[1]['marker'])
+
+    def test_HEAD_cached(self):
+        self.app.account_info_cache = LRUCache(10, ttl=60)
+        self.app.account_info_cache_soft_ttl = 5
+        self.storage.account_show = Mock(return_value=get_fake_info())
+
+        def head(now):
+            with patch('time.time', return_value=now):
+                resp = Request.blank('/v1/a', method='HEAD').get_response(
+                    self.app)
+                self.assertEqual(204, resp.status_int)
+                # Let the refresh happen
+                eventlet.sleep(0)
+
+        head(100.0)
+        head(104.0)
+        self.assertEqual(1, self.storage.account_show.call_count)
+        # Stale, but served while refreshed
+        self.storage.account_show.return_value = get_fake_info(
+            {'x-account-meta-foo': 'bar'})
+        with patch('time.time', return_value=106.0):
+            resp = Request.blank('/v1/a', method='HEAD').get_response(
+                self.app)
+            self.assertNotIn('x-account-meta-foo', resp.headers)
+            eventlet.sleep(0)
+        self.assertEqual(2, self.storage.account_show.call_count)
+        with patch('time.time', return_value=107.0):
+            resp = Request.blank('/v1/a', method='HEAD').get_response(
+                self.app)
+            self.assertEqual('bar', resp.headers['x-account-meta-foo'])
+        self.assertEqual(2, self.storage.account_show.call_count)
+        # Too old to be served
+        head(200.0)
+        self.assertEqual(3, self.storage.account_show.call_count)
+
+    def test_HEAD_cached_refresh_outdated(self):
+        self.app.account_info_cache = LRUCache(10, ttl=60)
+        self.app.account_info_cache_soft_ttl = 5
+        self.storage.account_show = Mock(return_value=get_fake_info())
+        with patch('time.time', return_value=100.0):
+            Request.blank('/v1/a', method='HEAD').get_response(self.app)
+
+        def account_show(account, **kwargs):
+            # The account is modified while its info is being refreshed
+            info = get_fake_info()
+            self.app.account_info_cache.pop(account)
+            return info
+        self.storage.account_show.side_effect = account_show
+        with patch('time.time', return_value=106.0):
+            Request.blank('/v1/a', method='HEAD').get_response(self.app)
+            eventlet.sleep(0)
+            self.assertEqual(2, self.storage.account_show.call_count)
+            # The outdated info has not been cached again
+            self.assertIsNone(self.app.account_info_cache.get('a'))
+
     def test_long_acct_names(self):
         long_acct_name = '%sLongAccountName' % (
             'Very' * (constraints.MAX_ACCOUNT_NAME_LENGTH // 4))
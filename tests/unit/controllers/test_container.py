@@ -1,9 +1,12 @@
+import json
 import unittest
 from mock import patch
 from mock import MagicMock as Mock
 
+from oio.common import exceptions as exc
 from oioswift.common.ring import FakeRing
 from oioswift import server as proxy_server
+from oioswift.utils import LRUCache
 from swift.common.swob import Request
 from swift.proxy.controllers.base import headers_to_container_info
 from swift.common.request_helpers import get_sys_meta_prefix
@@ -87,6 +90,34 @@ class TestContainerController(unittest.TestCase):
         for k in owner_headers['properties']:
             self.assertIn(k, resp.headers)
 
+    def test_HEAD_cached(self):
+        self.app.container_cache = LRUCache(10)
+        self.storage.container.container_get_properties = Mock(
+            return_value={'properties': {}, 'system': {}})
+        for _ in range(2):
+            resp = Request.blank('/v1/a/c', method='HEAD').get_response(
+                self.app)
+            self.assertEqual(204, resp.status_int)
+        self.assertEqual(
+            1, self.storage.container.container_get_properties.call_count)
+
+        # Missing containers are cached too
+        self.storage.container.container_get_properties = Mock(
+            side_effect=exc.NoSuchContainer())
+        for _ in range(2):
+            resp = Request.blank('/v1/a/c2', method='HEAD').get_response(
+                self.app)
+            self.assertEqual(404, resp.status_int)
+        self.assertEqual(
+            1, self.storage.container.container_get_properties.call_count)
+
+        # Modifying the container invalidates the cache
+        self.storage.container.container_set_properties = Mock()
+        req = Request.blank('/v1/a/c', method='POST',
+                            headers={'X-Container-Meta-Test': 'foo'})
+        req.get_response(self.app)
+        self.assertNotIn(('a', 'c'), self.app.container_cache)
+
     def test_sys_meta_headers_PUT(self):
         sys_meta_key = '%stest' % get_sys_meta_prefix('container')
         sys_meta_key = sys_meta_key.title()
@@ -119,3 +150,207 @@ class TestContainerController(unittest.TestCase):
         meta = self.storage.container.container_set_properties.call_args[0][2]
         self.assertEqual(meta[sys_meta_key], 'foo')
         self.assertEqual(meta[user_meta_key], 'bar')
+
+    def _listing_result(self):
+        return {
+            'objects': [
+                {'name': 'o1', 'size': 1, 'ctime': 1,
+                 'hash': 'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA',
+                 'mime_type': 'text/plain'},
+                {'name': 'o&2', 'size': 2, 'ctime': 2,
+                 'hash': 'BBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBB'}],
+            'prefixes': ['sub/'],
+            'properties': {},
+            'system': {}}
+
+    def test_POST_bulk_head(self):
+        self.storage.container.container_get_properties = Mock(
+            return_value={'properties': {}, 'system': {}})
+
+        def object_show(account, container, obj, **kwargs):
+            if obj == 'missing':
+                raise exc.NoSuchObject()
+            return {'hash': 'AAAA', 'length': 10, 'ctime': 0,
+                    'mime_type': 'text/plain', 'version': 42,
+                    'deleted': False,
+                    'properties': {'x-object-meta-foo': 'bar',
+                                   'x-object-sysmeta-foo': 'baz'}}
+        self.storage.object_show = Mock(side_effect=object_show)
+
+        req = Request.blank('/v1/a/c?bulk-head', method='POST',
+                            body=json.dumps(['o1', 'missing', 'o2']))
+        resp = req.get_response(self.app)
+        self.assertEqual(200, resp.status_int)
+        result = json.loads(resp.body)
+        self.assertEqual(['o1', 'o2'],
+                         [obj['name'] for obj in result['objects']])
+        self.assertEqual({'x-object-meta-foo': 'bar'},
+                         result['objects'][0]['meta'])
+        self.assertEqual('aaaa', result['objects'][0]['hash'])
+        self.assertEqual(10, result['objects'][0]['bytes'])
+        self.assertEqual(['missing'], result['not_found'])
+        self.assertEqual([], result['errors'])
+
+        req = Request.blank('/v1/a/c?bulk-head', method='POST',
+                            body='{"o1": 1}')
+        resp = req.get_response(self.app)
+        self.assertEqual(400, resp.status_int)
+
+    def _check_listing_streamed(self, listing):
+        for fmt in ('json', 'plain', 'xml'):
+            self.app.stream_listings = False
+            self.storage.object_list = Mock(side_effect=listing)
+            req = Request.blank('/v1/a/c?format=%s' % fmt, method='GET')
+            expected = req.get_response(self.app)
+
+            self.app.stream_listings = True
+            self.storage.object_list = Mock(side_effect=listing)
+            req = Request.blank('/v1/a/c?format=%s' % fmt, method='GET')
+            resp = req.get_response(self.app)
+            self.assertEqual(expected.status_int, resp.status_int)
+            self.assertEqual(expected.content_type, resp.content_type)
+            self.assertEqual(expected.body, resp.body)
+
+    def test_GET_listing_streaming(self):
+        self._check_listing_streamed(lambda *a, **kw: self._listing_result())
+
+    def test_GET_listing_streaming_same_body(self):
+        def empty(*args, **kwargs):
+            return {'objects': [], 'properties': {}, 'system': {}}
+
+        def one_object(*args, **kwargs):
+            result = empty()
+            result['objects'].append(
+                {'name': 'o1', 'size': 0, 'ctime': 1, 'hash': '',
+                 'mime_type': 'text/plain'})
+            return result
+
+        self._check_listing_streamed(empty)
+        self._check_listing_streamed(one_object)
+
+    def test_GET_listing_versioned_names(self):
+        def listing():
+            result = self._listing_result()
+            for version, obj in enumerate(result['objects'], 41):
+                obj['version'] = version
+            return result
+
+        for stream in (False, True):
+            self.app.stream_listings = stream
+            bodies = dict()
+            for fmt in ('json', 'plain', 'xml'):
+                self.storage.object_list = Mock(return_value=listing())
+                req = Request.blank(
+                    '/v1/a/c?format=%s' % fmt, method='GET',
+                    environ={'oio_query': {'versions': True,
+                                           'versioned_names': True}})
+                resp = req.get_response(self.app)
+                self.assertEqual(200, resp.status_int)
+                self.assertTrue(
+                    self.storage.object_list.call_args[1]['versions'])
+                bodies[fmt] = resp.body
+            self.assertEqual(
+                [('002o1/41', 41), ('003o&2/42', 42)],
+                [(obj['name'], obj['version'])
+                 for obj in json.loads(bodies['json'])
+                 if 'name' in obj])
+            self.assertEqual('002o1/41\n003o&2/42\nsub/\n', bodies['plain'])
+            self.assertIn('<name>003o&amp;2/42</name>', bodies['xml'])
+
+    def test_GET_listing_max_versions(self):
+        def obj(name, version):
+            return {'name': name, 'version': version, 'size': 1,
+                    'ctime': version, 'hash': 'A' * 32}
+
+        versions = [obj('a', 3), obj('a', 2), obj('a', 1), obj('b', 5),
+                    obj('b', 4), obj('b', 3), obj('c', 7), obj('c', 6)]
+
+        def object_list(account, container, marker=None, **kwargs):
+            # Pages of 4 versions, resuming after the name of the marker
+            objects = [o for o in versions if o['name'] > marker][:4]
+            return {'objects': objects, 'properties': {}, 'system': {},
+                    'truncated': objects[-1] is not versions[-1]}
+
+        self.app.container_listing_max_limit = 100000
+        self.app.stream_listings = True
+        self.storage.object_list = Mock(side_effect=object_list)
+        req = Request.blank(
+            '/v1/a/c?format=json&limit=20000', method='GET',
+            environ={'oio_query': {'versions': True, 'max_versions': 2}})
+        resp = req.get_response(self.app)
+        self.assertEqual(200, resp.status_int)
+        # The versions of "b" span two pages: the second one starts
+        # after "a", not after "b"
+        self.assertEqual(
+            [('a', 3), ('a', 2), ('b', 5), ('b', 4), ('c', 7), ('c', 6)],
+            [(o['name'], o['version']) for o in json.loads(resp.body)])
+        self.assertEqual(
+            ['', 'a', 'b'],
+            [c[1]['marker'] for c in self.storage.object_list.call_args_list])
+
+        # The latest versions are listed by the backend
+        self.storage.object_list = Mock(return_value={
+            'objects': [obj('a', 3), obj('b', 5)],
+            'properties': {}, 'system': {}})
+        req = Request.blank(
+            '/v1/a/c?format=json', method='GET',
+            environ={'oio_query': {'versions': True, 'max_versions': 1}})
+        resp = req.get_response(self.app)
+        self.assertEqual(200, resp.status_int)
+        self.assertFalse(self.storage.object_list.call_args[1]['versions'])
+        self.assertTrue(self.storage.object_list.call_args[1]['deleted'])
+        self.assertEqual(
+            [('a', 3), ('b', 5)],
+            [(o['name'], o['version']) for o in json.loads(resp.body)])
+
+    def test_GET_listing_streaming_empty(self):
+        self.app.stream_listings = True
+        self.storage.object_list = Mock(
+            return_value={'objects': [], 'properties': {}, 'system': {}})
+        req = Request.blank('/v1/a/c?format=plain', method='GET')
+        resp = req.get_response(self.app)
+        self.assertEqual(204, resp.status_int)
+        req = Request.blank('/v1/a/c?format=json', method='GET')
+        resp = req.get_response(self.app)
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual('[]', resp.body)
+
+    def test_GET_listing_paginated(self):
+        self.app.container_listing_max_limit = 100000
+        self.app.stream_listings = True
+        pages = [
+            {'objects': [{'name': 'o1', 'size': 1, 'ctime': 1,
+                          'hash': 'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA'}],
+             'properties': {}, 'system': {},
+             'truncated': True, 'next_marker': 'o1'},
+            {'objects': [{'name': 'o2', 'size': 2, 'ctime': 2,
+                          'hash': 'BBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBB'}],
+             'properties': {}, 'system': {},
+             'truncated': False},
+        ]
+        self.storage.object_list = Mock(side_effect=pages)
+        req = Request.blank('/v1/a/c?format=plain&limit=20000', method='GET')
+        resp = req.get_response(self.app)
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual('o1\no2\n', resp.body)
+        self.assertEqual(2, self.storage.object_list.call_count)
+        first, second = self.storage.object_list.call_args_list
+        self.assertEqual(10000, first[1]['limit'])
+        self.assertEqual('', first[1]['marker'])
+        self.assertEqual(10000, second[1]['limit'])
+        self.assertEqual('o1', second[1]['marker'])
+
+    def test_GET_listing_max_limit(self):
+        self.storage.object_list = Mock(
+            return_value={'objects': [], 'properties': {}, 'system': {}})
+        req = Request.blank('/v1/a/c?limit=20000', method='GET')
+        resp = req.get_response(self.app)
+        self.assertEqual(412, resp.status_int)
+
+        self.app.container_listing_max_limit = 20000
+        req = Request.blank('/v1/a/c?limit=20000', method='GET')
+        resp = req.get_response(self.app)
+        self.assertEqual(204, resp.status_int)
+        req = Request.blank('/v1/a/c?limit=20001', method='GET')
+        resp = req.get_response(self.app)
+        self.assertEqual(412, resp.status_int)
@@ -1,7 +1,11 @@
 # These tests make a lot of assumptions about the inner working of oio-sds
 # Python API, and thus will stop working at some point.
 
+import json
+import shutil
+import tempfile
 import unittest
+from hashlib import md5
 from mock import MagicMock as Mock
 from mock import patch
 
@@ -12,8 +16,12 @@ from oio.common import green as oiogreen
 from oio.common.http import CustomHttpConnection
 from swift.proxy.controllers.base import get_info as _real_get_info
 from swift.common.swob import Request
+from swift.common.utils import FileLikeIter
+from oioswift.common.range_cache import RangeCache
 from oioswift.common.ring import FakeRing
 from oioswift import server as proxy_server
+from oioswift.proxy.controllers.obj import ObjectController
+from oioswift.utils import LRUCache
 from tests.unit import FakeStorageAPI, FakeMemcache, debug_logger
 
 
@@ -71,11 +79,13 @@ class PatchedObjControllerApp(proxy_server.Application):
 
 class TestObjectController(unittest.TestCase):
     container_info = {
+        'status': 200,
         'write_acl': None,
         'read_acl': None,
         'storage_policy': None,
         'sync_key': None,
         'versions': None,
+        'meta': {},
     }
 
     def setUp(self):
@@ -132,6 +142,98 @@ class TestObjectController(unittest.TestCase):
         self.assertEqual(resp.status_int, 200)
         self.assertIn('Accept-Ranges', resp.headers)
 
+    def test_HEAD_cached(self):
+        self.app.object_metadata_cache = LRUCache(10, ttl=60)
+        ret_val = {
+            'ctime': 0,
+            'hash': 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+            'length': 1,
+            'deleted': False,
+            'version': 42,
+        }
+        self.storage.object_show = Mock(return_value=ret_val)
+        with patch.object(self.app.logger, 'increment') as increment:
+            for _ in range(2):
+                req = Request.blank('/v1/a/c/o', method='HEAD')
+                resp = req.get_response(self.app)
+                self.assertEqual(resp.status_int, 200)
+                self.assertEqual(resp.etag,
+                                 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa')
+        self.storage.object_show.assert_called_once_with(
+            'a', 'c', 'o', version=None)
+        self.assertEqual(
+            ['object_metadata_cache.miss', 'object_metadata_cache.hit'],
+            [call[0][0] for call in increment.call_args_list])
+
+        # Deleting the object must invalidate the cache
+        self.storage.object_delete = Mock()
+        req = Request.blank('/v1/a/c/o', method='DELETE')
+        req.get_response(self.app)
+        self.storage.object_show = Mock(side_effect=exc.NoSuchObject)
+        req = Request.blank('/v1/a/c/o', method='HEAD')
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 404)
+
+    def test_container_info_cached(self):
+        self.app.container_cache = LRUCache(10)
+        ret_value = ({
+            'hash': 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+            'ctime': 0,
+            'length': 0,
+            'deleted': False,
+            'version': 42,
+            }, fake_stream(0))
+        self.storage.object_fetch = Mock(return_value=ret_value)
+        with patch('swift.proxy.controllers.base.Controller.container_info',
+                   return_value=dict(self.container_info)) as mock_info:
+            for _ in range(2):
+                resp = Request.blank('/v1/a/c/o').get_response(self.app)
+                self.assertEqual(resp.status_int, 200)
+        self.assertEqual(1, mock_info.call_count)
+
+    def test_container_info_cached_copy(self):
+        self.app.container_cache = LRUCache(10)
+        error_info = dict(self.container_info, status=503)
+        controller = ObjectController(self.app, 'a', 'c', 'o')
+        with patch('swift.proxy.controllers.base.Controller.container_info',
+                   side_effect=[error_info, dict(self.container_info)]) \
+                as mock_info:
+            info = controller.container_info('a', 'c')
+            self.assertEqual(503, info['status'])
+            info = controller.container_info('a', 'c')
+            info['meta']['color'] = 'blue'
+            self.assertEqual({}, controller.container_info('a', 'c')['meta'])
+        # The error has not been cached, the success has
+        self.assertEqual(2, mock_info.call_count)
+
+    def test_GET_not_modified_cached(self):
+        self.app.object_metadata_cache = LRUCache(10, ttl=60)
+        ret_val = {
+            'ctime': 0,
+            'hash': 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+            'length': 1,
+            'deleted': False,
+            'version': 42,
+        }
+        self.storage.object_show = Mock(return_value=ret_val)
+        req = Request.blank('/v1/a/c/o', method='HEAD')
+        req.get_response(self.app)
+
+        self.storage.object_fetch = Mock(
+            return_value=(ret_val, fake_stream(1)))
+        req = Request.blank(
+            '/v1/a/c/o',
+            headers={'If-None-Match': 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa'})
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 304)
+        self.assertFalse(self.storage.object_fetch.called)
+
+        req = Request.blank('/v1/a/c/o', headers={'If-None-Match': 'other'})
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(resp.body, 'X')
+        self.assertTrue(self.storage.object_fetch.called)
+
     def test_PUT_simple(self):
         req = Request.blank('/v1/a/c/o', method='PUT')
         req.headers['content-length'] = '0'
@@ -144,6 +246,226 @@ class TestObjectController(unittest.TestCase):
                 file_or_path=req.environ['wsgi.input'], policy=None)
         self.assertEqual(resp.status_int, 201)
 
+    def test_PUT_metadata_filtered(self):
+        req = Request.blank('/v1/a/c/o', method='PUT', headers={
+            'Content-Length': '0',
+            'X-Object-Meta-Color': 'blue',
+            'X-Object-Sysmeta-Foo': 'bar',
+            'Content-Disposition': 'inline',
+            'X-Container-Meta-Color': 'red',
+            'X-Foo': 'baz'})
+        self.storage.object_create = Mock(return_value=({}, 0, ''))
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 201)
+        self.assertEqual(
+            {'x-object-meta-color': 'blue', 'x-object-sysmeta-foo': 'bar',
+             'content-disposition': 'inline'},
+            self.storage.object_create.call_args[1]['metadata'])
+
+    def test_metadata_filter_subclass(self):
+        class CustomController(ObjectController):
+            allowed_headers = ObjectController.allowed_headers | {'x-foo'}
+
+        headers = {'X-Foo': 'baz', 'Content-Disposition': 'inline'}
+        controller = ObjectController(self.app, 'a', 'c', 'o')
+        self.assertEqual({'content-disposition': 'inline'},
+                         controller.load_object_metadata(headers))
+        controller = CustomController(self.app, 'a', 'c', 'o')
+        self.assertEqual({'x-foo': 'baz', 'content-disposition': 'inline'},
+                         controller.load_object_metadata(headers))
+        other = CustomController(self.app, 'a', 'c', 'o2')
+        self.assertIs(controller.metadata_filter, other.metadata_filter)
+
+    def test_GET_copy_source(self):
+        ret_value = ({
+            'hash': 'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA',
+            'ctime': 0,
+            'length': 1,
+            'deleted': False,
+            'version': 42,
+            'mime_type': 'text/plain',
+            }, fake_stream(1))
+        self.storage.object_fetch = Mock(return_value=ret_value)
+        req = Request.blank('/v1/a/c/o')
+        resp = req.get_response(self.app)
+        self.assertNotIn('X-Object-Sysmeta-Oio-Copy-Source', resp.headers)
+
+        req = Request.blank('/v1/a/c/o', environ={'swift.source': 'SSC'})
+        resp = req.get_response(self.app)
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(
+            {'account': 'a', 'container': 'c', 'object': 'o',
+             'version': 42, 'hash': 'a' * 32, 'mime_type': 'text/plain'},
+            json.loads(resp.headers['X-Object-Sysmeta-Oio-Copy-Source']))
+
+    def _slo_storage(self, segment_hash='a' * 32):
+        manifest = json.dumps([
+            {'name': '/c_seg/o/%d' % i, 'hash': segment_hash, 'bytes': 3}
+            for i in range(4)])
+        objects = {
+            ('c', 'o'): ({'hash': 'b' * 32, 'ctime': 0,
+                          'length': len(manifest), 'deleted': False,
+                          'version': 42, 'mime_type': 'text/plain',
+                          'properties': {'x-static-large-object': 'True'}},
+                         manifest)}
+        for i in range(4):
+            objects[('c_seg', 'o/%d' % i)] = (
+                {'hash': 'a' * 32, 'length': 3}, iter(['ab', str(i)]))
+
+        def _object_fetch(account, container, obj, **kwargs):
+            metadata, data = objects[(container, obj)]
+            return metadata, iter(data)
+        self.storage.object_fetch = Mock(side_effect=_object_fetch)
+        self.app.slo_prefetch_segments = 2
+
+    def test_GET_slo_prefetch(self):
+        self._slo_storage()
+        req = Request.blank('/v1/a/c/o', environ={'swift_owner': True})
+        resp = req.get_response(self.app)
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual('ab0ab1ab2ab3', resp.body)
+        self.assertEqual(12, resp.content_length)
+        self.assertEqual('"%s"' % md5('a' * 128).hexdigest(),
+                         resp.headers['Etag'])
+        self.assertNotIn('X-Static-Large-Object', resp.headers)
+        self.assertEqual(5, self.storage.object_fetch.call_count)
+
+    def test_GET_slo_manifest(self):
+        self._slo_storage()
+        for req in (Request.blank('/v1/a/c/o'),
+                    Request.blank('/v1/a/c/o?multipart-manifest=get',
+                                  environ={'swift_owner': True})):
+            resp = req.get_response(self.app)
+            self.assertEqual(200, resp.status_int)
+            self.assertEqual(4, len(json.loads(resp.body)))
+            self.assertEqual('True', resp.headers['X-Static-Large-Object'])
+        self.assertEqual(2, self.storage.object_fetch.call_count)
+
+    def test_GET_slo_segment_changed(self):
+        self._slo_storage(segment_hash='c' * 32)
+        req = Request.blank('/v1/a/c/o', environ={'swift_owner': True})
+        resp = req.get_response(self.app)
+        self.assertEqual(409, resp.status_int)
+
+    def _copy_request(self, **kwargs):
+        source = {'account': 'a', 'container': 'c', 'object': 'src',
+                  'version': 42, 'hash': 'a' * 32, 'mime_type': 'text/plain'}
+        source.update(kwargs)
+        req = Request.blank(
+            '/v1/a/c/o', method='PUT', body='abc',
+            environ={'swift.source': 'SSC'},
+            headers={'Content-Type': 'text/plain',
+                     'X-Object-Meta-Color': 'blue',
+                     'X-Object-Sysmeta-Oio-Copy-Source': json.dumps(source)})
+        return req
+
+    def test_PUT_copy_linked(self):
+        self.storage.object_link = Mock()
+        self.storage.object_create = Mock()
+        req = self._copy_request()
+        resp = req.get_response(self.app)
+        self.assertEqual(201, resp.status_int)
+        self.assertEqual('a' * 32, resp.etag)
+        self.assertFalse(self.storage.object_create.called)
+        self.storage.object_link.assert_called_once_with(
+            'a', 'c', 'src', 'a', 'c', 'o', target_version=42,
+            properties_directive='REPLACE',
+            metadata={'x-object-meta-color': 'blue'})
+
+    def test_PUT_copy_linked_closes_source(self):
+        self.storage.object_link = Mock()
+        closed = []
+
+        def source_iter():
+            try:
+                yield 'abc'
+            finally:
+                closed.append(True)
+
+        # The copy middleware sends the app_iter of the source GET
+        app_iter = source_iter()
+        next(app_iter)
+        req = self._copy_request()
+        req.environ['wsgi.input'] = FileLikeIter(app_iter)
+        resp = req.get_response(self.app)
+        self.assertEqual(201, resp.status_int)
+        self.assertEqual([True], closed)
+
+    def test_PUT_copy_not_linked(self):
+        received = []
+
+        def object_create(account, container, file_or_path=None, **kwargs):
+            received.append(file_or_path.read())
+            self.assertNotIn('x-object-sysmeta-oio-copy-source',
+                             kwargs['metadata'])
+            return {}, 3, '900150983cd24fb0d6963f7d28e17f72'
+
+        self.storage.object_create = Mock(side_effect=object_create)
+        # No link primitive in the backend
+        resp = self._copy_request().get_response(self.app)
+        self.assertEqual(201, resp.status_int)
+        # The content type cannot be changed by a link
+        self.storage.object_link = Mock()
+        resp = self._copy_request(
+            mime_type='text/html').get_response(self.app)
+        self.assertEqual(201, resp.status_int)
+        self.assertFalse(self.storage.object_link.called)
+        # The link failed
+        self.storage.object_link = Mock(side_effect=exc.OioException)
+        resp = self._copy_request().get_response(self.app)
+        self.assertEqual(201, resp.status_int)
+        self.assertEqual(['abc'] * 3, received)
+
+    def test_PUT_read_ahead(self):
+        self.app.upload_read_ahead = 2
+        self.app.client_chunk_size = 3
+        req = Request.blank('/v1/a/c/o', method='PUT', body='abcdefgh')
+        received = []
+
+        def object_create(account, container, file_or_path=None, **kwargs):
+            self.assertIsNot(file_or_path, req.environ['wsgi.input'])
+            received.append(file_or_path.read(5))
+            received.append(file_or_path.read())
+            return {}, 8, 'e8dc4081b13434b45189a720b77b6818'
+
+        self.storage.object_create = Mock(side_effect=object_create)
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 201)
+        self.assertEqual(['abcde', 'fgh'], received)
+
+    def test_PUT_auto_policy(self):
+        self.app.oio_stgpol = [('SINGLE', 0), ('EC', 5), ('BIG', 100)]
+        self.app.oio_stgpol_offsets = [0, 5, 100]
+        ret_val = ({}, 0, '')
+        self.storage.object_create = Mock(return_value=ret_val)
+        for length, policy in ((0, 'SINGLE'), (4, 'SINGLE'), (5, 'EC'),
+                               (99, 'EC'), (100, 'BIG')):
+            req = Request.blank('/v1/a/c/o', method='PUT', body='X' * length)
+            resp = req.get_response(self.app)
+            self.assertEqual(resp.status_int, 201)
+            self.assertEqual(
+                policy, self.storage.object_create.call_args[1]['policy'])
+
+    def test_PUT_chunked_auto_policy(self):
+        self.app.oio_stgpol = [('SINGLE', 0), ('EC', 5)]
+        self.app.oio_stgpol_offsets = [0, 5]
+        self.app.auto_storage_policy_buffer_size = 5
+        self.app.client_chunk_size = 2
+        received = []
+
+        def object_create(account, container, file_or_path=None, **kwargs):
+            received.append((kwargs['policy'], file_or_path.read()))
+            return {}, 0, ''
+
+        self.storage.object_create = Mock(side_effect=object_create)
+        for body in ('abc', 'abcdefgh'):
+            req = Request.blank('/v1/a/c/o', method='PUT', body=body)
+            del req.headers['Content-Length']
+            req.headers['Transfer-Encoding'] = 'chunked'
+            resp = req.get_response(self.app)
+            self.assertEqual(resp.status_int, 201)
+        self.assertEqual([('SINGLE', 'abc'), ('EC', 'abcdefgh')], received)
+
     def test_PUT_requires_length(self):
         req = Request.blank('/v1/a/c/o', method='PUT')
         resp = req.get_response(self.app)
@@ -167,18 +489,61 @@ class TestObjectController(unittest.TestCase):
         req.headers['if-none-match'] = '*'
         req.headers['content-length'] = '0'
         ret_val = ({}, 0, '')
+        self.storage.object_show = Mock(side_effect=exc.NoSuchObject)
         self.storage.object_create = Mock(return_value=ret_val)
         resp = req.get_response(self.app)
         self.assertEqual(resp.status_int, 201)
 
+    def test_PUT_if_none_match_delete_marker(self):
+        req = Request.blank('/v1/a/c/o', method='PUT')
+        req.headers['if-none-match'] = '*'
+        req.headers['content-length'] = '0'
+        self.storage.object_show = Mock(return_value={'deleted': 'true'})
+        self.storage.object_create = Mock(return_value=({}, 0, ''))
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 201)
+
     def test_PUT_if_none_match_denied(self):
         req = Request.blank('/v1/a/c/o', method='PUT')
         req.headers['if-none-match'] = '*'
         req.headers['content-length'] = '0'
+        self.storage.object_show = Mock(side_effect=exc.NoSuchObject)
         self.storage.object_create = Mock(side_effect=exc.PreconditionFailed)
         resp = req.get_response(self.app)
         self.assertEqual(resp.status_int, 412)
 
+    def test_PUT_if_none_match_exists(self):
+        class FakeReader(object):
+            def read(self, size):
+                raise AssertionError('The data must not be read')
+
+        req = Request.blank('/v1/a/c/o', method='PUT',
+                            environ={'wsgi.input': FakeReader()})
+        req.headers['if-none-match'] = '*'
+        req.headers['content-length'] = '10'
+        self.app.upload_read_ahead = 2
+        self.storage.object_show = Mock(return_value={'deleted': False})
+        self.storage.object_create = Mock()
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 412)
+        self.assertFalse(self.storage.object_create.called)
+
+    def test_PUT_if_none_match_created_meanwhile(self):
+        req = Request.blank('/v1/a/c/o', method='PUT', body='abc')
+        req.headers['if-none-match'] = '*'
+        # The object appears while its data is being uploaded
+        self.storage.object_show = Mock(
+            side_effect=[exc.NoSuchObject(), {'deleted': False}])
+
+        def object_create(account, container, file_or_path=None, **kwargs):
+            while file_or_path.read(2):
+                pass
+            return {}, 3, 'abc'
+        self.storage.object_create = Mock(side_effect=object_create)
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 412)
+        self.assertEqual(2, self.storage.object_show.call_count)
+
     def test_PUT_if_none_match_not_star(self):
         req = Request.blank('/v1/a/c/o', method='PUT')
         req.headers['if-none-match'] = 'foo'
@@ -271,6 +636,171 @@ class TestObjectController(unittest.TestCase):
         self.assertEqual(resp.status_int, 200)
         self.assertIn('Accept-Ranges', resp.headers)
 
+    def test_GET_metadata_filtered(self):
+        req = Request.blank('/v1/a/c/o')
+        ret_value = ({
+            'hash': 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+            'ctime': 0,
+            'length': 1,
+            'deleted': False,
+            'version': 42,
+            'properties': {'x-object-meta-color': 'blue',
+                           'X-Object-Sysmeta-Foo': 'bar',
+                           'content-encoding': 'gzip',
+                           'x-foo': 'baz'},
+            }, fake_stream(1))
+        self.storage.object_fetch = Mock(return_value=ret_value)
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual('blue', resp.headers.get('X-Object-Meta-Color'))
+        self.assertEqual('bar', resp.headers.get('X-Object-Sysmeta-Foo'))
+        self.assertEqual('gzip', resp.headers.get('Content-Encoding'))
+        self.assertNotIn('X-Foo', resp.headers)
+
+    def test_GET_timing(self):
+        self.app.timing_header = True
+        req = Request.blank('/v1/a/c/o')
+        ret_value = ({
+            'hash': 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+            'ctime': 0,
+            'length': 2,
+            'deleted': False,
+            'version': 42,
+            }, fake_stream(2))
+        self.storage.object_fetch = Mock(return_value=ret_value)
+        with patch.object(self.app.logger, 'timing') as timing_stat:
+            resp = req.get_response(self.app)
+            self.assertEqual(resp.status_int, 200)
+            self.assertTrue(resp.headers['X-Oio-Timing'].startswith(
+                'object_fetch='))
+            self.assertIn('total=', resp.headers['X-Oio-Timing'])
+            self.assertEqual('XX', resp.body)
+        timing = req.environ['oio.timing']
+        self.assertEqual(['object_fetch'],
+                         [name for name, _duration in timing.calls])
+        self.assertIsNotNone(timing.first_byte)
+        self.assertIsNotNone(timing.last_byte)
+        metrics = [call[0][0] for call in timing_stat.call_args_list]
+        self.assertIn('storage.object_fetch.ok.timing', metrics)
+        self.assertIn('storage.object_fetch.first_byte.timing', metrics)
+        self.assertIn('storage.object_fetch.last_byte.timing', metrics)
+
+    def test_GET_read_ahead(self):
+        self.app.download_read_ahead = 2
+        self.app.client_chunk_size = 4
+        req = Request.blank('/v1/a/c/o')
+        ret_value = ({
+            'hash': 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+            'ctime': 0,
+            'length': 10,
+            'deleted': False,
+            'version': 42,
+            }, fake_stream(10))
+        self.storage.object_fetch = Mock(return_value=ret_value)
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 200)
+        self.assertEqual(['XXXX', 'XXXX', 'XX'], list(resp.app_iter))
+
+    def test_GET_multiple_ranges_parallel(self):
+        self.app.range_fetch_concurrency = 2
+        body = 'abcdefghij'
+        meta = {
+            'hash': 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+            'ctime': 0,
+            'length': len(body),
+            'deleted': False,
+            'version': 42,
+            }
+
+        def object_fetch(account, container, obj, ranges=None,
+                         version=None):
+            self.assertEqual(42 if len(ranges) == 1 else None, version)
+            return meta, iter(body[start:end + 1] for start, end in ranges)
+
+        self.storage.object_fetch = Mock(side_effect=object_fetch)
+        req = Request.blank('/v1/a/c/o',
+                            headers={'Range': 'bytes=8-9,0-1,2-3'})
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 206)
+        boundary = resp.headers['Content-Type'].split('boundary=')[1]
+        parts = resp.body.split('--' + boundary)
+        self.assertEqual(
+            ['ij', 'ab', 'cd'],
+            [part.split('\r\n\r\n', 1)[1][:-2] for part in parts[1:-1]])
+        # Adjacent ranges are fetched at once
+        self.assertEqual(
+            [[(8, 9), (0, 1), (2, 3)], [(0, 3)], [(8, 9)]],
+            [call[1]['ranges']
+             for call in self.storage.object_fetch.call_args_list])
+
+    def test_GET_multiple_ranges_parallel_large_span(self):
+        self.app.range_fetch_concurrency = 2
+        self.app.client_chunk_size = 1
+        body = 'abcdefghijklmnopqrstuvwxyz'
+        meta = {
+            'hash': 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+            'ctime': 0,
+            'length': len(body),
+            'deleted': False,
+            'version': 42,
+            }
+
+        def object_fetch(account, container, obj, ranges=None,
+                         version=None):
+            return meta, iter(body[start:end + 1] for start, end in ranges)
+
+        self.storage.object_fetch = Mock(side_effect=object_fetch)
+        req = Request.blank('/v1/a/c/o',
+                            headers={'Range': 'bytes=0-1,2-19,24-25'})
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 206)
+        boundary = resp.headers['Content-Type'].split('boundary=')[1]
+        parts = resp.body.split('--' + boundary)
+        self.assertEqual(
+            ['ab', 'cdefghijklmnopqrst', 'yz'],
+            [part.split('\r\n\r\n', 1)[1][:-2] for part in parts[1:-1]])
+        # The span of 20 bytes is too large to be kept in memory
+        self.assertEqual(1, self.storage.object_fetch.call_count)
+
+    def test_GET_range_cached(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        self.app.range_cache = RangeCache(path, 1000, block_size=4)
+        body = 'abcdefghij'
+        meta = {
+            'hash': 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+            'ctime': 0,
+            'length': len(body),
+            'deleted': False,
+            'version': 42,
+            }
+
+        def object_fetch(account, container, obj, ranges=None,
+                         version=None):
+            self.assertEqual(42, version)
+            return meta, iter(body[start:end + 1] for start, end in ranges)
+
+        self.storage.object_show = Mock(return_value=meta)
+        self.storage.object_fetch = Mock(side_effect=object_fetch)
+        req = Request.blank('/v1/a/c/o', headers={'Range': 'bytes=3-6'})
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 206)
+        self.assertEqual('defg', resp.body)
+        self.assertEqual(
+            [[(0, 3)], [(4, 7)]],
+            [call[1]['ranges']
+             for call in self.storage.object_fetch.call_args_list])
+
+        self.storage.object_fetch.reset_mock()
+        req = Request.blank('/v1/a/c/o', headers={'Range': 'bytes=5-'})
+        resp = req.get_response(self.app)
+        self.assertEqual(resp.status_int, 206)
+        self.assertEqual('fghij', resp.body)
+        self.assertEqual(
+            [[(8, 9)]],
+            [call[1]['ranges']
+             for call in self.storage.object_fetch.call_args_list])
+
     def test_GET_not_found(self):
         req = Request.blank('/v1/a/c/o')
         self.storage.object_fetch = Mock(side_effect=exc.NoSuchObject)
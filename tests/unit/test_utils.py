@@ -0,0 +1,144 @@
+import unittest
+from mock import patch
+
+from oioswift.utils import IterO, LRUCache, ReadAheadIterator, parse_query
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(2)
+        self.assertEqual(0, cache.set('a', 1))
+        self.assertEqual(0, cache.set('b', 2))
+        # 'a' becomes the most recently used entry
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(1, cache.set('c', 3))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+        self.assertEqual(2, len(cache))
+
+    def test_ttl(self):
+        cache = LRUCache(2, ttl=10)
+        with patch('time.time', return_value=100.0):
+            cache.set('a', 1)
+        with patch('time.time', return_value=105.0):
+            self.assertEqual(1, cache.get('a'))
+        with patch('time.time', return_value=111.0):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(0, len(cache))
+
+    def test_pop(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        self.assertEqual(1, cache.pop('a'))
+        self.assertIsNone(cache.pop('a'))
+        self.assertNotIn('a', cache)
+
+
+class TestParseQuery(unittest.TestCase):
+    def test_parse_query(self):
+        env = {'QUERY_STRING': 'a=1&b=2&a=3'}
+        query = parse_query(env)
+        self.assertEqual({'a': ['1', '3'], 'b': ['2']}, query)
+        self.assertIs(query, parse_query(env))
+        self.assertIs(query, parse_query(dict(env)))
+        env['QUERY_STRING'] = 'c'
+        self.assertEqual({}, parse_query(env))
+        self.assertEqual({}, parse_query({}))
+
+
+class TestReadAheadIterator(unittest.TestCase):
+    def test_coalesce(self):
+        source = iter(['a', 'bc', 'd', 'efgh', 'i'])
+        self.assertEqual(['abc', 'defgh', 'i'],
+                         list(ReadAheadIterator(source, 2, buffer_size=3)))
+
+    def test_no_buffer(self):
+        source = ['a', 'bc', 'd']
+        self.assertEqual(source, list(ReadAheadIterator(iter(source), 1)))
+
+    def test_error(self):
+        def source():
+            yield 'a'
+            raise IOError('boom')
+
+        it = ReadAheadIterator(source(), 4)
+        self.assertEqual('a', next(it))
+        self.assertRaises(IOError, next, it)
+
+    def test_close(self):
+        closed = []
+
+        def source():
+            try:
+                while True:
+                    yield 'a'
+            finally:
+                closed.append(True)
+
+        gen = source()
+        it = ReadAheadIterator(gen, 2)
+        self.assertEqual('a', next(it))
+        it.close()
+        self.assertTrue(it.reader.dead)
+        self.assertEqual([True], closed)
+
+
+class TestIterO(unittest.TestCase):
+    def test_read(self):
+        reader = IterO(iter(['abc', '', 'defg', 'h']))
+        self.assertEqual('ab', reader.read(2))
+        self.assertEqual('cde', reader.read(3))
+        self.assertEqual('', reader.read(0))
+        self.assertEqual('fgh', reader.read(10))
+        self.assertEqual('', reader.read(1))
+        self.assertEqual('', reader.read())
+
+    def test_read_all(self):
+        reader = IterO(iter(['abc', 'defg']))
+        self.assertEqual('a', reader.read(1))
+        self.assertEqual('bcdefg', reader.read())
+        self.assertEqual('', reader.read())
+
+    def test_drops_read_data(self):
+        reader = IterO(iter(['abcd'] * 1000))
+        for _ in range(1000):
+            self.assertEqual('ab', reader.read(2))
+            self.assertEqual('cd', reader.read(2))
+            self.assertEqual(0, reader._available)
+            self.assertEqual(0, len(reader._chunks))
+
+    def test_buffer_bounded(self):
+        reader = IterO(iter(['x' * 100] * 1000))
+        buf = bytearray(13)
+        received = 0
+        while True:
+            count = len(reader.read(7)) + reader.readinto(buf)
+            if not count:
+                break
+            received += count
+            # Never more than one chunk of the source held in advance
+            self.assertLess(reader._available, 100)
+            self.assertLessEqual(len(reader._chunks), 1)
+        self.assertEqual(100000, received)
+
+    def test_readinto(self):
+        reader = IterO(iter(['abc', 'defg']))
+        buf = bytearray(5)
+        self.assertEqual(5, reader.readinto(buf))
+        self.assertEqual('abcde', str(buf))
+        self.assertEqual(2, reader.readinto(buf))
+        self.assertEqual('fg', str(buf[:2]))
+        self.assertEqual(0, reader.readinto(buf))
+
+    def test_close(self):
+        def source():
+            while True:
+                yield 'a'
+
+        gen = source()
+        reader = IterO(gen)
+        self.assertEqual('aa', reader.read(2))
+        reader.close()
+        self.assertRaises(ValueError, reader.read, 1)
+        self.assertRaises(StopIteration, next, gen)